@@ -20,31 +20,94 @@ class GameConfig:
         self.time_of_day = random.choice(config['time_options'])
         self.location = random.choice(config['location_options'])
 
-# Existing DecisionTree class (unchanged)
+# Per-column encoding of DecisionTree features and labels
+class FeatureEncoder:
+    def __init__(self):
+        self.column_encoders = []
+        self.column_codes = []
+        self.label_encoder = LabelEncoder()
+        self.context_cache = {}
+
+    def fit(self, X, y):
+        X = np.asarray(X)
+        self.column_encoders = [LabelEncoder().fit(column) for column in X.T]
+        self.label_encoder.fit(y)
+        # Keyed by str(value): np.asarray coerces a mixed training set to strings
+        # (True -> 'True', 1 -> '1'), and str() does the same without truncating
+        self.column_codes = [{str(value): code for code, value in enumerate(encoder.classes_)}
+                             for encoder in self.column_encoders]
+        self.context_cache = {}
+        return self.transform(X), self.label_encoder.transform(y)
+
+    def transform(self, X):
+        return np.column_stack([encoder.transform(column)
+                                for encoder, column in zip(self.column_encoders, np.asarray(X).T)])
+
+    def encode_context(self, context):
+        """
+        Encode one decision context with the encoding fitted in `fit`.
+
+        :param context: A tuple with one value per feature column
+        :return: A tuple of integer codes, or None if a value was not seen in training
+        """
+        # The encoding depends only on the coerced values, so they are the cache key
+        # (True and 1 hash alike but encode as 'True' and '1')
+        keys = tuple(str(value) for value in context)
+        if keys in self.context_cache:
+            return self.context_cache[keys]
+        if len(keys) != len(self.column_codes):
+            raise ValueError(f"Expected {len(self.column_codes)} features, got {len(keys)}")
+        codes = []
+        for key, column_codes in zip(keys, self.column_codes):
+            if key not in column_codes:
+                codes = None
+                break
+            codes.append(column_codes[key])
+        codes = tuple(codes) if codes is not None else None
+        self.context_cache[keys] = codes
+        return codes
+
+    def decode_label(self, code):
+        return self.label_encoder.classes_[code]
+
+# Modified DecisionTree class: encoders are fitted per column and cached per context
 class DecisionTree:
     def __init__(self):
         self.clf = DecisionTreeClassifier(random_state=42)
-        self.label_encoder = LabelEncoder()
+        self.encoder = FeatureEncoder()
         self.feature_names = ['npc_friendly', 'npc_has_item', 'player_has_item', 'time_of_day', 'location']
         self.trained = False
+        self.decision_cache = {}
 
     def train(self, X, y):
-        X_encoded = np.array([self.label_encoder.fit_transform(x) for x in X.T]).T
-        y_encoded = self.label_encoder.fit_transform(y)
+        X_encoded, y_encoded = self.encoder.fit(X, y)
         self.clf.fit(X_encoded, y_encoded)
+        self.decision_cache = {}
         self.trained = True
 
+    def default_decision(self, npc_friendly, npc_has_item, player_has_item):
+        if npc_friendly:
+            return 'talk' if npc_has_item else 'give_item'
+        else:
+            return 'trade' if player_has_item else 'ignore'
+
     def make_decision(self, npc_friendly, npc_has_item, player_has_item, time_of_day, location):
         if not self.trained:
-            if npc_friendly:
-                return 'talk' if npc_has_item else 'give_item'
+            return self.default_decision(npc_friendly, npc_has_item, player_has_item)
+
+        context = (npc_friendly, npc_has_item, player_has_item, time_of_day, location)
+        # Keyed with types: True and 1 are equal keys but encode differently
+        cache_key = tuple((type(value), value) for value in context)
+        decision = self.decision_cache.get(cache_key)
+        if decision is None:
+            codes = self.encoder.encode_context(context)
+            if codes is None:
+                # A value the tree was never trained on
+                decision = self.default_decision(npc_friendly, npc_has_item, player_has_item)
             else:
-                return 'trade' if player_has_item else 'ignore'
-        
-        X = np.array([[npc_friendly, npc_has_item, player_has_item, time_of_day, location]])
-        X_encoded = np.array([self.label_encoder.transform(x) for x in X.T]).T
-        decision_encoded = self.clf.predict(X_encoded)[0]
-        return self.label_encoder.inverse_transform([decision_encoded])[0]
+                decision = self.encoder.decode_label(self.clf.predict([codes])[0])
+            self.decision_cache[cache_key] = decision
+        return decision
 
 # New class for Lesson 5: NPC Response Templates
 class NPCResponseTemplates:
@@ -1,9 +1,39 @@
 import random
 import json
+import os
+import sys
+import time
+import bisect
+import heapq
+import cProfile
+import pstats
+import pickle
+import socket
+import uuid
+import re
+import copy
+import itertools
+import warnings
+import tracemalloc
+import gzip
+import zlib
+import argparse
+import threading
+import http.client
+from array import array
+from collections import deque, namedtuple
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Pipe, Process, get_all_start_methods, get_context, shared_memory
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from sklearn.tree import DecisionTreeClassifier
+from sklearn.tree._tree import Tree
+from sklearn.model_selection import KFold
 import numpy as np
+import numpy.lib.recfunctions as rfn
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
 from ipywidgets import widgets, Layout, HTML, VBox, HBox, GridspecLayout
 from IPython.display import display, clear_output
@@ -21,20 +51,315 @@ COLOR_SCHEME = {
     'secondary_button_color': '#fccb62',
 }
 
-class NPCConfig:
+# Category orderings used to encode NPC decision features.
+# 'dungeon' is the in-game name for the training data's 'cave' location.
+MOOD_OPTIONS = ['happy', 'neutral', 'angry']
+TIME_OPTIONS = ['morning', 'afternoon', 'evening', 'night']
+LOCATION_CODES = {'forest': 0, 'village': 1, 'castle': 2, 'cave': 3, 'dungeon': 3}
+
+# Parsed JSON config files, shared by every game in the process
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+def load_json_config(path):
+    # Configs are read-only once loaded, so sessions share one parsed copy
+    # and only re-read the file when it changes on disk
+    mtime = os.path.getmtime(path)
+    with _config_cache_lock:
+        cached = _config_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'r') as f:
+                cached = (mtime, json.load(f))
+            _config_cache[path] = cached
+    return cached[1]
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_PHASE = _NullPhase()
+
+class _PhaseTimer:
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class PhaseHistogram:
+    # Log-spaced latency buckets from 1us to 10s
+    BOUNDS = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+
     def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile
+        target = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000,
+            'min_ms': self.min * 1000,
+            'max_ms': self.max * 1000,
+            'p50_ms': self.percentile(50) * 1000,
+            'p90_ms': self.percentile(90) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'buckets': {f"<={bound * 1000:.4g}ms": n for bound, n in zip(self.BOUNDS, self.buckets) if n},
+        }
+
+class SamplingProfiler:
+    # Samples one thread's Python stack at a fixed interval; thread_id can be
+    # moved to the thread of each turn being profiled
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.active = False  # only sample while a turn is running
+        self.self_counts = {}
+        self.stack_counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                if leaf:
+                    self.self_counts[key] = self.self_counts.get(key, 0) + 1
+                    leaf = False
+                if key not in seen:
+                    seen.add(key)
+                    self.stack_counts[key] = self.stack_counts.get(key, 0) + 1
+                frame = frame.f_back
+
+    def report(self, limit=25):
+        def top(counts):
+            ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+            return [{'function': key, 'samples': n, 'fraction': n / self.samples} for key, n in ranked]
+        return {'mode': 'sampling', 'samples': self.samples, 'interval_s': self.interval,
+                'self': top(self.self_counts), 'cumulative': top(self.stack_counts)}
+
+class TurnInstrumentation:
+    # Times the phases of each turn, counts events and optionally profiles a
+    # window of turns. Phase times are inclusive, so nested phases (e.g. 'log'
+    # inside 'update_game_state') are also part of their parent's time.
+    # When disabled, phase() hands back a shared no-op context manager.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.profile_report = None
+        self._profile_turns = 0  # turns of the window not yet claimed by a thread
+        self._profile_claimed = 0  # claimed turns that have not ended
+        self._profile_mode = None
+        self._profiler = None
+        self._profile_gate = threading.Lock()  # held by the one turn being profiled
+        self._local = threading.local()  # the profiler of this thread's current turn
+        self._enabled_before_profile = enabled
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.phases = {}
+            self.counters = {}
+            self.turns = 0
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _PhaseTimer(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.phases.get(name)
+            if histogram is None:
+                histogram = self.phases[name] = PhaseHistogram()
+            histogram.add(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def profile_turns(self, turns, mode='cprofile', interval=0.001):
+        # Profile the next `turns` turns with cProfile or the sampling profiler;
+        # the result is left in profile_report. Instrumentation stays enabled
+        # for the window and goes back to its previous state afterwards.
+        if mode not in ('cprofile', 'sampling'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        with self.lock:
+            if not self._profile_turns and not self._profile_claimed:
+                self._enabled_before_profile = self.enabled
+            self.enabled = True
+            self.profile_report = None
+            self._profile_turns = turns
+            self._profile_mode = (mode, interval)
+
+    def begin_turn(self):
+        # Turns of a profiling window may start on several threads at once (one
+        # per session in a SessionPool). Each claims a place in the window and
+        # then waits for the profile gate, so profiled turns run one at a time
+        # and the profiler only ever sees the thread of the turn it is timing.
+        if not self.enabled:
+            return
+        with self.lock:
+            claimed = self._profile_turns > 0
+            if claimed:
+                self._profile_turns -= 1
+                self._profile_claimed += 1
+        if not claimed:
+            return
+        self._profile_gate.acquire()
+        if self._profiler is None:
+            mode, interval = self._profile_mode
+            if mode == 'cprofile':
+                self._profiler = cProfile.Profile()
+            else:
+                self._profiler = SamplingProfiler(threading.get_ident(), interval)
+                self._profiler.start()
+        self._local.profiler = self._profiler
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.enable()
+        else:
+            self._profiler.thread_id = threading.get_ident()
+            self._profiler.active = True
+
+    def end_turn(self):
+        if self.enabled:
+            with self.lock:
+                self.turns += 1
+        profiler = getattr(self._local, 'profiler', None)
+        if profiler is None:
+            return
+        self._local.profiler = None
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.active = False
+        with self.lock:
+            self._profile_claimed -= 1
+            finished = not self._profile_turns and not self._profile_claimed
+        if finished:
+            self.finish_profile()
+        self._profile_gate.release()
+
+    def finish_profile(self, limit=25):
+        profiler, self._profiler = self._profiler, None
+        with self.lock:
+            self._profile_turns = 0
+            self.enabled = self._enabled_before_profile
+        if isinstance(profiler, cProfile.Profile):
+            stats = pstats.Stats(profiler)
+            rows = []
+            for (filename, lineno, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+                rows.append({'function': f"{function} ({os.path.basename(filename)}:{lineno})",
+                             'calls': ncalls, 'tottime_ms': tottime * 1000, 'cumtime_ms': cumtime * 1000})
+            rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+            self.profile_report = {'mode': 'cprofile', 'functions': rows[:limit]}
+        elif profiler is not None:
+            profiler.stop()
+            self.profile_report = profiler.report(limit)
+
+    def to_dict(self):
+        with self.lock:
+            report = {
+                'turns': self.turns,
+                'phases': {name: histogram.to_dict() for name, histogram in self.phases.items()},
+                'counters': dict(self.counters),
+            }
+        if self.profile_report is not None:
+            report['profile'] = self.profile_report
+        return report
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+class SessionRNG:
+    # Seeded random streams for one game session. Each subsystem draws from its
+    # own named stream, so e.g. sampling the action buttons never shifts the
+    # sequence of NPC responses, and a session can be replayed from its seed.
+    def __init__(self, seed=None):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self.streams = {}
+
+    def stream(self, name):
+        rng = self.streams.get(name)
+        if rng is None:
+            rng = self.streams[name] = random.Random(f"{self.seed}:{name}")
+        return rng
+
+class NPCConfig:
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random
         self.load_npc_config()
 
     def load_npc_config(self):
-        with open('npc_config.json', 'r') as f:
-            config = json.load(f)
+        config = load_json_config('npc_config.json')
         self.health = config['initial_health']
-        self.friendly = random.choice(config['friendly_options'])
-        self.has_item = random.choice(config['has_item_options'])
-        self.mood = random.choice(config['mood_options'])
+        self.friendly = self.rng.choice(config['friendly_options'])
+        self.has_item = self.rng.choice(config['has_item_options'])
+        self.mood = self.rng.choice(config['mood_options'])
+        self.interaction_history_size = config.get('interaction_history_size', 1000)
+        # Optional ModelSizeSearch settings, e.g. {"tolerance": 0.01}; absent means an unconstrained tree
+        self.model_search = config.get('model_search')
 
 class GameConfig:
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random
         self.load_game_config()
         self.time_options = ["morning", "afternoon", "evening", "night"]
         self.location_options = ["forest", "village", "castle", "dungeon"]
@@ -44,46 +369,231 @@ class GameConfig:
         self.location = "village"
         
     def load_game_config(self):
-        with open('game_config.json', 'r') as f:
-            config = json.load(f)
+        config = load_json_config('game_config.json')
         self.player_health = config['initial_player_health']
         self.player_friendly = config['initial_player_friendly']
         self.player_has_item = config['initial_player_has_item']
-        self.time_of_day = random.choice(config['time_options'])
-        self.location = random.choice(config['location_options'])
+        self.time_of_day = self.rng.choice(config['time_options'])
+        self.location = self.rng.choice(config['location_options'])
         self.turn_count = 0
-        self.game_log = []
         self.COLOR_SCHEME = config['color_scheme']
         self.attack_keywords = config['attack_keywords']
         self.give_keywords = config['give_keywords']
         self.npc_attack_damage = config['npc_attack_damage']
         self.npc_evolution_turns = config['npc_evolution_turns']
         self.environment_change_turns = config['environment_change_turns']
+        self.status_refresh_hz = config.get('status_refresh_hz', 10)
+        self.log_retention = config.get('log_retention', 500)
+        self.log_display_entries = config.get('log_display_entries', 100)
+        self.log_spill_dir = config.get('log_spill_dir')  # None drops entries past log_retention
+        self.world_npcs = config.get('world_npcs', [])  # [{"name", "location", "active_times"?}, ...]
+
+class TrainingDataLoader:
+    # Streams {"features": [[...], ...], "labels": [...]} from disk in fixed-size
+    # reads, without building the JSON object tree. Complete rows in each read
+    # are parsed into an int64 block in one vectorized call (true/false become
+    # 1/0), so the peak is the parsed blocks plus one read buffer.
+    # Only the top-level keys count: the text between them is scanned for
+    # brackets and strings to track the nesting depth.
+    KEYS = ('features', 'labels')
+    TOKEN = re.compile(r'[\[\]{}"]')
+    STRING_REST = re.compile(r'(?:[^"\\]|\\.)*"')  # after the opening quote
+    NEXT_CHAR = re.compile(r'\s*(\S)')
+    ROWS_END = re.compile(r'\]\s*\]')
+    SEPARATORS = str.maketrans('[],', '   ')
+    ROW_END = np.iinfo(np.int64).min  # stands in for each ']' when parsing feature rows
+
+    def __init__(self, path, read_size=1 << 20):
+        self.path = path
+        self.read_size = read_size
+        self.width = None
+
+    def load(self):
+        sections = {}
+        with open(self.path, 'r') as f:
+            buf = ''
+            pos = 0
+            depth = 0
+            while True:
+                token = self.TOKEN.search(buf, pos)
+                if token is not None and token.group() != '"':
+                    depth += 1 if token.group() in '[{' else -1
+                    pos = token.end()
+                    continue
+                if token is not None:
+                    key_end = self.STRING_REST.match(buf, token.end())
+                    colon = self.NEXT_CHAR.match(buf, key_end.end()) if key_end is not None else None
+                    is_key = depth == 1 and colon is not None and colon.group(1) == ':'
+                    value = self.NEXT_CHAR.match(buf, colon.end()) if is_key else None
+                    if key_end is not None and colon is not None and (not is_key or value is not None):
+                        key = buf[token.end():key_end.end() - 1]
+                        if not is_key or key not in self.KEYS:
+                            pos = key_end.end()
+                            continue
+                        if key in sections:
+                            raise ValueError(f"{self.path}: '{key}' appears more than once")
+                        if value.group(1) != '[':
+                            raise ValueError(f"{self.path}: '{key}' must be an array")
+                        reader = self.read_features if key == 'features' else self.read_labels
+                        sections[key], buf = reader(f, buf[value.end():])
+                        pos = 0
+                        continue
+                    # The string, or what follows it, continues in the next read
+                    buf, pos = buf[token.start():], 0
+                else:
+                    buf, pos = '', 0
+                chunk = f.read(self.read_size)
+                if not chunk:
+                    break
+                buf += chunk
+
+        if 'features' not in sections or 'labels' not in sections:
+            raise ValueError(f"{self.path}: expected 'features' and 'labels' arrays")
+        X, y = sections['features'], sections['labels']
+        if len(X) != len(y):
+            raise ValueError(f"{self.path}: {len(X)} feature rows but {len(y)} labels")
+        return X, y
+
+    def parse_block(self, text, rows=None):
+        # Parse a run of complete values (or `rows` complete feature rows)
+        if rows is not None:
+            text = text.replace(']', f' {self.ROW_END} ')
+        text = text.translate(self.SEPARATORS).replace('true', '1').replace('false', '0')
+        if not text.strip():
+            values = np.empty(0, dtype=np.int64)
+            if rows:
+                raise ValueError(f"{self.path}: empty feature rows")
+            return values
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)  # raised by fromstring on malformed values
+            try:
+                values = np.fromstring(text, dtype=np.int64, sep=' ')
+            except (ValueError, DeprecationWarning):
+                raise ValueError(f"{self.path}: training data must contain only integers and booleans")
+        if rows is None:
+            return values
+        # Every row must end exactly where its ']' does, not just add up to the total
+        if (values.size != rows * (self.width + 1) or np.count_nonzero(values == self.ROW_END) != rows
+                or not (values[self.width::self.width + 1] == self.ROW_END).all()):
+            raise ValueError(f"{self.path}: feature rows must all have {self.width} values")
+        return values.reshape(rows, self.width + 1)[:, :-1]
+
+    def read_features(self, f, buf):
+        blocks = []
+        while True:
+            if buf.lstrip().startswith(']'):
+                rest = buf.lstrip()[1:]
+                break
+            end = self.ROWS_END.search(buf)
+            if end is not None:
+                body, rest = buf[:end.start() + 1], buf[end.end():]
+            else:
+                cut = buf.rfind(']')
+                body, rest = (buf[:cut + 1], buf[cut + 1:]) if cut >= 0 else ('', buf)
+            if body:
+                if self.width is None:
+                    # Validate the schema once, from the first row
+                    self.width = self.parse_block(body[body.index('[') + 1:body.index(']')]).size
+                blocks.append(self.parse_block(body, body.count('[')))
+            if end is not None:
+                break
+            chunk = f.read(self.read_size)
+            if not chunk:
+                raise ValueError(f"{self.path}: unterminated 'features' array")
+            buf = rest + chunk
+        width = self.width or 0
+        X = np.concatenate(blocks) if blocks else np.empty((0, width), dtype=np.int64)
+        return X, rest
+
+    def read_labels(self, f, buf):
+        blocks = []
+        while True:
+            end = buf.find(']')
+            if end >= 0:
+                blocks.append(self.parse_block(buf[:end]))
+                rest = buf[end + 1:]
+                break
+            cut = buf.rfind(',')
+            if cut >= 0:
+                blocks.append(self.parse_block(buf[:cut]))
+                buf = buf[cut + 1:]
+            chunk = f.read(self.read_size)
+            if not chunk:
+                raise ValueError(f"{self.path}: unterminated 'labels' array")
+            buf += chunk
+        y = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+        return y, rest
 
 class NPCTrainingData:
-    def __init__(self):
+    # Distinct (features, label) rows with the number of times each was seen.
+    # Training passes counts as sample_weight, which fits the same tree as the
+    # expanded rows, so cost scales with distinct situations rather than turns.
+    def __init__(self, path='npc_training_data.json'):
+        self.path = path
         self.load_initial_training_data()
 
     def load_initial_training_data(self):
-        with open('npc_training_data.json', 'r') as f:
-            training_data = json.load(f)
-        self.X = np.array(training_data['features'])
-        self.y = np.array(training_data['labels'])
-        
-        # Convert boolean values to integers
-        self.X = np.array([[int(val) if isinstance(val, bool) else val for val in row] for row in self.X])
+        # Booleans are converted to integers while parsing
+        X, y = TrainingDataLoader(self.path).load()
+        self.X = np.empty((0, X.shape[1]), dtype=np.int64)
+        self.y = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.index = {}  # row bytes (features + label) -> position in X/y/counts
+        self.append(X, y)
+
+    def __len__(self):
+        # Number of rows the weighted set stands for
+        return int(self.counts.sum())
+
+    def append(self, X, y):
+        # Existing arrays and the index are never modified in place, so shallow
+        # copies of a training set (as SessionPool makes) stay independent
+        if not len(y):
+            return
+        rows = np.column_stack([np.asarray(X, dtype=np.int64).reshape(len(y), -1), np.asarray(y, dtype=np.int64)])
+        low = rows.min(axis=0)
+        span = rows.max(axis=0) - low + 1
+        if np.prod(span.astype(float)) < 2 ** 62:
+            # Categorical values are small, so each row packs into one int64 key
+            # and a 1-D unique replaces the much slower row-wise one
+            radix = np.cumprod(np.concatenate([[1], span[:-1]]))
+            keys = (rows - low) @ radix
+            _, first, row_counts = np.unique(keys, return_index=True, return_counts=True)
+            unique_rows = rows[first]
+        else:
+            unique_rows, row_counts = np.unique(rows, axis=0, return_counts=True)
+        counts = self.counts.copy()
+        new_rows, new_counts = [], []
+        index = self.index
+        for row, count in zip(unique_rows, row_counts):
+            position = index.get(row.tobytes())
+            if position is not None:
+                counts[position] += count
+            else:
+                if index is self.index:
+                    index = dict(self.index)
+                index[row.tobytes()] = len(counts) + len(new_rows)
+                new_rows.append(row)
+                new_counts.append(count)
+        if new_rows:
+            new_rows = np.array(new_rows)
+            self.X = np.vstack([self.X, new_rows[:, :-1]])
+            self.y = np.hstack([self.y, new_rows[:, -1]])
+            counts = np.hstack([counts, new_counts])
+        self.counts = counts
+        self.index = index
 
 class NPCResponseTemplates:
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = rng if rng is not None else random
         self.load_response_templates()
 
     def load_response_templates(self):
-        with open('npc_responses.json', 'r') as f:
-            self.response_templates = json.load(f)
+        self.response_templates = load_json_config('npc_responses.json')
 
     def get_response(self, response_type, player_action, npc_name):
         templates = self.response_templates[response_type]
-        chosen_template = random.choice(templates)
+        chosen_template = self.rng.choice(templates)
         
         response = chosen_template.format(
             player_action=player_action,
@@ -92,64 +602,223 @@ class NPCResponseTemplates:
         
         return response
 
+class InteractionHistory:
+    # Most recent interactions in a fixed-size ring buffer backed by a NumPy
+    # structured array. Context fields are stored already encoded as decision
+    # features, and player actions as codes into action_names.
+    DTYPE = np.dtype([
+        ('player_action', np.uint16),
+        ('npc_action', np.int8),
+        ('player_friendly', np.uint8),
+        ('player_has_item', np.uint8),
+        ('health', np.int16),
+        ('mood', np.uint8),
+        ('time_of_day', np.uint8),
+        ('location', np.uint8),
+    ])
+    FEATURES = ['player_friendly', 'player_has_item', 'health', 'mood', 'time_of_day', 'location']
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=self.DTYPE)
+        self.total = 0  # interactions ever appended, including overwritten ones
+        self.action_names = []
+        self.action_codes = {}
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, player_action, npc_action, features):
+        code = self.action_codes.get(player_action)
+        if code is None:
+            code = self.action_codes[player_action] = len(self.action_names)
+            self.action_names.append(player_action)
+        self.records[self.total % self.capacity] = (code, npc_action, *features)
+        self.total += 1
+
+    def last(self, n):
+        # The n most recent records, oldest first
+        n = min(n, len(self))
+        indices = np.arange(self.total - n, self.total) % self.capacity
+        return self.records[indices]
+
+    def training_slice(self, n):
+        records = self.last(n)
+        X = rfn.structured_to_unstructured(records[self.FEATURES], dtype=np.int64)
+        y = records['npc_action'].astype(np.int64)
+        return X, y
+
+def _weighted_tree(params, X, sample_weight):
+    # A tree that, fitted with integer sample weights, is the one min_samples_leaf
+    # gives on the expanded rows: the leaf size is counted in occurrences. With
+    # integer weights, a weight threshold in (leaf - 0.5, leaf] rejects the same
+    # splits and, through its 2 * threshold node check, stops at the same nodes
+    # without calling the splitter, which keeps its random feature order in step.
+    # leaf - 0.25 is clear of rounding in sklearn's fraction * total.
+    params = dict(params)
+    leaf = params.pop('min_samples_leaf', 1)
+    fraction = (leaf - 0.25) / sample_weight.sum()
+    if fraction > 0.5:
+        # Too few occurrences for two leaves of this size, so the root stays a leaf
+        return DecisionTreeClassifier(random_state=42, min_samples_split=len(X) + 1, **params)
+    return DecisionTreeClassifier(random_state=42, min_weight_fraction_leaf=fraction, **params)
+
+def _evaluate_tree_candidates(X, y, sample_weight, folds, candidates):
+    # Runs in a ModelSizeSearch worker process. sample_weight holds integer
+    # counts; folds are drawn over the expanded occurrences, as KFold on the
+    # expanded rows would draw them, so a distinct row can be split between a
+    # training and a test fold. Every fit and score is then weighted by the
+    # occurrences on each side, and matches cross-validation on the expanded rows.
+    occurrences = np.repeat(np.arange(len(y)), sample_weight)
+    splits = []
+    for _, test in KFold(folds, shuffle=True, random_state=42).split(occurrences):
+        test_weight = np.bincount(occurrences[test], minlength=len(y))
+        train_weight = sample_weight - test_weight
+        splits.append((np.flatnonzero(train_weight), train_weight, np.flatnonzero(test_weight), test_weight))
+    results = []
+    for index, params in candidates:
+        scores = []
+        for train, train_weight, test, test_weight in splits:
+            clf = _weighted_tree(params, X[train], train_weight[train]).fit(X[train], y[train], sample_weight=train_weight[train])
+            scores.append(np.average(clf.predict(X[test]) == y[test], weights=test_weight[test]))
+        score = np.mean(scores)
+        clf = _weighted_tree(params, X, sample_weight).fit(X, y, sample_weight=sample_weight)
+        results.append({'index': index, 'params': params, 'cv_accuracy': float(score),
+                        'node_count': int(clf.tree_.node_count), 'depth': int(clf.get_depth())})
+    return results
+
+class ModelSizeSearch:
+    # Cross-validates a grid of tree size limits in a process pool and keeps the
+    # smallest tree (fewest nodes) whose accuracy is within `tolerance` of the best.
+    # One search, and so one pool, is meant to be shared by every NPC in a
+    # process; whoever creates it closes it. Workers use the platform's default
+    # start method unless `mp_context` names another, e.g. 'forkserver' for a
+    # threaded server. Non-fork methods need this code importable by the
+    # workers, which it is not when defined in a notebook.
+    def __init__(self, max_depths=(None, 2, 3, 4, 6, 8), min_samples_leafs=(1, 2, 5),
+                 ccp_alphas=(0.0, 0.001, 0.01), tolerance=0.01, folds=5, workers=None, mp_context=None):
+        self.candidates = [
+            {'max_depth': depth, 'min_samples_leaf': leaf, 'ccp_alpha': alpha}
+            for depth in max_depths for leaf in min_samples_leafs for alpha in ccp_alphas
+        ]
+        self.tolerance = tolerance
+        self.folds = folds
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.mp_context = mp_context
+        self.executor = None
+
+    def evaluate(self, X, y, sample_weight, folds):
+        if self.executor is None:
+            mp_context = get_context(self.mp_context) if self.mp_context is not None else None
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=mp_context)
+        # One job per worker, so the training data is pickled once per worker
+        batches = [list(enumerate(self.candidates))[i::self.workers] for i in range(self.workers)]
+        futures = [self.executor.submit(_evaluate_tree_candidates, X, y, sample_weight, folds, batch)
+                   for batch in batches if batch]
+        results = [result for future in futures for result in future.result()]
+        return sorted(results, key=lambda result: result['index'])
+
+    def fit(self, X, y, sample_weight):
+        folds = min(self.folds, int(sample_weight.sum()))
+        if folds < 2:
+            return DecisionTreeClassifier(random_state=42).fit(X, y, sample_weight=sample_weight), None
+        results = self.evaluate(X, y, sample_weight, folds)
+        best = max(result['cv_accuracy'] for result in results)
+        eligible = [result for result in results if result['cv_accuracy'] >= best - self.tolerance]
+        chosen = min(eligible, key=lambda result: (result['node_count'], result['depth'], result['index']))
+        clf = _weighted_tree(chosen['params'], X, sample_weight).fit(X, y, sample_weight=sample_weight)
+
+        sample = X[:1]
+        repeats = 200
+        start = time.perf_counter()
+        for _ in range(repeats):
+            clf.predict(sample)
+        latency = (time.perf_counter() - start) / repeats
+
+        report = {
+            'params': chosen['params'],
+            'cv_accuracy': chosen['cv_accuracy'],
+            'best_cv_accuracy': best,
+            'node_count': chosen['node_count'],
+            'depth': chosen['depth'],
+            'max_node_count': max(result['node_count'] for result in results),
+            'decision_latency_us': latency * 1e6,
+            'candidates': len(results),
+        }
+        return clf, report
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
 class NPCDecisionTree:
-    def __init__(self, training_data):
+    def __init__(self, training_data, clf=None, history_size=1000, model_search=None):
         self.training_data = training_data
-        self.clf = self.train_decision_tree()
-        self.interaction_history = []
+        self.model_search = model_search
+        self.model_selection_history = []
+        self.model_version = 0  # bumped whenever clf is replaced
+        self.publisher = None  # SharedModelPublisher that receives each retrained model
+        # A classifier already fitted on training_data can be shared; retraining replaces it
+        self.clf = clf if clf is not None else self.train_decision_tree()
+        self.interaction_history = InteractionHistory(history_size)
         self.accuracy_history = []
         self.tree_depth_history = []
 
     def train_decision_tree(self):
+        if self.model_search is not None:
+            clf, report = self.model_search.fit(self.training_data.X, self.training_data.y, self.training_data.counts)
+            if report is not None:
+                self.model_selection_history.append(report)
+            return clf
         clf = DecisionTreeClassifier(random_state=42)
-        clf.fit(self.training_data.X, self.training_data.y)
+        clf.fit(self.training_data.X, self.training_data.y, sample_weight=self.training_data.counts)
         return clf
 
-    def decide_action(self, player_friendly, player_has_item, time_of_day, location, health, mood):
-        features = [
+    def publish_to(self, publisher):
+        # Worker processes reading the publisher see the current model now and each retrained one later
+        self.publisher = publisher
+        publisher.publish(self.clf)
+
+    def encode_features(self, player_friendly, player_has_item, time_of_day, location, health, mood):
+        return [
             int(player_friendly),
             int(player_has_item),
-            health,
-            ['happy', 'neutral', 'angry'].index(mood),
-            ['morning', 'afternoon', 'evening', 'night'].index(time_of_day),
-            ['forest', 'village', 'castle', 'cave'].index(location)
+            int(health),
+            MOOD_OPTIONS.index(mood),
+            TIME_OPTIONS.index(time_of_day),
+            LOCATION_CODES[location]
         ]
-        action = self.clf.predict([features])[0]
-        return action
+
+    def predict(self, features):
+        return self.clf.predict([features])[0]
+
+    def decide_action(self, player_friendly, player_has_item, time_of_day, location, health, mood):
+        return self.predict(self.encode_features(player_friendly, player_has_item, time_of_day, location, health, mood))
 
     def update_decision_tree(self):
-        new_X = []
-        new_y = []
-        for interaction in self.interaction_history[-10:]:  # Consider last 10 interactions
-            context = interaction['context']
-            new_X.append([
-                int(context[0]),  # player_friendly
-                int(context[1]),  # player_has_item
-                int(context[2]),  # health
-                ['happy', 'neutral', 'angry'].index(context[3]),  # mood
-                ['morning', 'afternoon', 'evening', 'night'].index(context[4]),  # time_of_day
-                ['forest', 'village', 'castle', 'cave'].index(context[5])  # location
-            ])
-            new_y.append(interaction['npc_action'])
+        new_X, new_y = self.interaction_history.training_slice(10)  # Consider last 10 interactions
 
         # Add new data to existing training data
-        self.training_data.X = np.vstack([self.training_data.X, new_X])
-        self.training_data.y = np.hstack([self.training_data.y, new_y])
+        self.training_data.append(new_X, new_y)
 
         # Retrain the classifier
         self.clf = self.train_decision_tree()
+        self.model_version += 1
+        if self.publisher is not None:
+            self.publisher.publish(self.clf)
 
         # Calculate and store performance metrics
         y_pred = self.clf.predict(self.training_data.X)
-        accuracy = np.mean(y_pred == self.training_data.y)
+        accuracy = np.average(y_pred == self.training_data.y, weights=self.training_data.counts)
         self.accuracy_history.append(accuracy)
         self.tree_depth_history.append(self.clf.get_depth())
 
     def get_action_distribution(self):
         # Calculate the distribution of NPC actions
-        action_counts = np.bincount(self.training_data.y, minlength=6)
+        action_counts = np.bincount(self.training_data.y, weights=self.training_data.counts, minlength=6)
         action_names = ['Attack', 'Talk', 'Flee', 'Give Item', 'Trade', 'Ignore']
-        return dict(zip(action_names, action_counts / len(self.training_data.y)))
+        return dict(zip(action_names, action_counts / self.training_data.counts.sum()))
 
 class NPCVisualizer:
     def __init__(self, decision_tree):
@@ -249,27 +918,37 @@ class NPCVisualizer:
         return fig
 
 class NPC:
-    def __init__(self, name):
+    def __init__(self, name, training_data=None, clf=None, rng=None, model_search=None):
+        # model_search is the owning Game's shared ModelSizeSearch; None trains unconstrained trees
         self.name = name
-        self.config = NPCConfig()
-        self.training_data = NPCTrainingData()
-        self.response_templates = NPCResponseTemplates()
-        self.decision_tree = NPCDecisionTree(self.training_data)
+        self.rng = rng
+        self.config = NPCConfig(rng.stream('npc') if rng is not None else None)
+        self.training_data = training_data if training_data is not None else NPCTrainingData()
+        self.response_templates = NPCResponseTemplates(rng.stream('responses') if rng is not None else None)
+        self.decision_tree = NPCDecisionTree(self.training_data, clf, self.config.interaction_history_size, model_search)
         self.visualizer = NPCVisualizer(self.decision_tree)
         self.health = self.config.health
         self.mood = self.config.mood
         self.has_item = self.config.has_item
+        self.last_action = None
+        self.last_response = None
+        self.cooldowns = set()
+        self.instrumentation = TurnInstrumentation()  # replaced by the owning Game's
 
     def interact(self, player_action, player_friendly, player_has_item, time_of_day, location):
-        action = self.decision_tree.decide_action(player_friendly, player_has_item, time_of_day, location, self.health, self.mood)
-        self.decision_tree.interaction_history.append({
-            'player_action': player_action,
-            'npc_action': action,
-            'context': [player_friendly, player_has_item, self.health, self.mood, time_of_day, location]
-        })
-        
+        with self.instrumentation.phase('decide_action'):
+            features = self.decision_tree.encode_features(player_friendly, player_has_item, time_of_day, location, self.health, self.mood)
+            action = self.decision_tree.predict(features)
+        return self.respond(player_action, features, action)
+
+    def respond(self, player_action, features, action):
+        self.decision_tree.interaction_history.append(player_action, action, features)
+
         response_type = self.get_response_type(action, player_action)
-        response = self.response_templates.get_response(response_type, player_action, self.name)
+        with self.instrumentation.phase('get_response'):
+            response = self.response_templates.get_response(response_type, player_action, self.name)
+        self.last_action = action
+        self.last_response = response
         
         return response
 
@@ -302,12 +981,147 @@ class NPC:
     def plot_feature_importance(self):
         return self.visualizer.plot_feature_importance()
 
+class GameLogStore:
+    # The game's message log. The newest `retention` entries are kept in memory
+    # as (seq, timestamp, message_type, message); older ones are appended in
+    # batches to a gzip-compressed JSON-lines segment at spill_path, or dropped
+    # when there is none.
+    def __init__(self, retention=500, spill_path=None, spill_batch=100):
+        self.retention = retention
+        self.spill_path = spill_path
+        self.spill_batch = spill_batch
+        self.entries = deque()
+        self.spill_buffer = []
+        self.total = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.total
+
+    def append(self, message, message_type='system'):
+        entry = (self.total, time.time(), message_type, message)
+        self.entries.append(entry)
+        self.total += 1
+        if len(self.entries) > self.retention:
+            oldest = self.entries.popleft()
+            if self.spill_path is None:
+                self.dropped += 1
+            else:
+                self.spill_buffer.append(oldest)
+                if len(self.spill_buffer) >= self.spill_batch:
+                    self.flush()
+        return entry
+
+    def flush(self):
+        if not self.spill_buffer:
+            return
+        # Each flush appends one gzip member; readers see the concatenation
+        with gzip.open(self.spill_path, 'at', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in self.spill_buffer)
+        self.spilled += len(self.spill_buffer)
+        self.spill_buffer = []
+
+    def recent(self, n):
+        n = min(n, len(self.entries))
+        return list(itertools.islice(self.entries, len(self.entries) - n, None))
+
+    def since(self, seq):
+        # Retained entries with sequence number >= seq
+        if not self.entries:
+            return []
+        offset = max(0, seq - self.entries[0][0])
+        return list(itertools.islice(self.entries, offset, None))
+
+    def read_spilled(self):
+        self.flush()
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return []
+        with gzip.open(self.spill_path, 'rt', encoding='utf-8') as f:
+            return [tuple(json.loads(line)) for line in f]
+
+    def close(self):
+        self.flush()
+
+_UNSET = object()
+
+class StatusPanel:
+    # Status bar backed by a small state model. Each field has its own widget and
+    # only fields whose value changed are sent to the frontend, at most
+    # max_refresh_hz times per second; changes arriving faster are coalesced
+    # and pushed by a timer.
+    FIELDS = ('player_health', 'time_of_day', 'location', 'player_has_item', 'npc_health')
+
+    def __init__(self, max_refresh_hz=10, instrumentation=None):
+        self.min_interval = 1.0 / max_refresh_hz
+        self.instrumentation = instrumentation if instrumentation is not None else TurnInstrumentation()
+        self.widgets = {field: widgets.HTML() for field in self.FIELDS}
+        self.container = HBox([self.widgets[field] for field in self.FIELDS],
+                              layout=Layout(width='100%', justify_content='space-around', align_items='center'))
+        self.container.add_class('status-box')
+        self.shown = {}
+        self.pending = {}
+        self.last_push = 0.0
+        self.timer = None
+        self.lock = threading.Lock()
+        self.messages_sent = 0
+
+    def render(self, field, value):
+        if field in ('player_health', 'npc_health'):
+            label, color = ('Player Health', '#4CAF50') if field == 'player_health' else ('NPC Health', '#FF9800')
+            return f"""
+            <div style="width: 200px; color: {COLOR_SCHEME['text']};">
+                <div style="font-size: 14px;">{label}</div>
+                <div style="background-color: #ddd; border-radius: 10px; overflow: hidden;">
+                    <div style="width: {value}%; height: 20px; background-color: {color}; border-radius: 10px;"></div>
+                </div>
+            </div>
+            """
+        if field == 'time_of_day':
+            text = f"Time of Day: {value}"
+        elif field == 'location':
+            text = f"Location: {value}"
+        else:
+            text = f"Player has item: {'Yes' if value else 'No'}"
+        return f'<div style="color: {COLOR_SCHEME["text"]};">{text}</div>'
+
+    def update(self, **state):
+        with self.lock:
+            for field, value in state.items():
+                if self.shown.get(field, _UNSET) != value:
+                    self.pending[field] = value
+                else:
+                    self.pending.pop(field, None)
+            if not self.pending:
+                return
+            wait = self.last_push + self.min_interval - time.monotonic()
+            if wait <= 0:
+                self.push()
+            elif self.timer is None:
+                self.timer = threading.Timer(wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.timer = None
+            self.push()
+
+    def push(self):
+        # Caller holds self.lock; each widget value change is one frontend message
+        for field, value in self.pending.items():
+            self.widgets[field].value = self.render(field, value)
+            self.shown[field] = value
+        self.messages_sent += len(self.pending)
+        self.instrumentation.count('status_messages', len(self.pending))
+        self.pending.clear()
+        self.last_push = time.monotonic()
+
 class GameInterface:
     def __init__(self, game):
         self.game = game
         self.player_animating = False
         self.npc_animating = False
-        self.game_log = []  # Initialize the game_log attribute
         self.setup_interface()
 
     def setup_interface(self):
@@ -430,10 +1244,9 @@ class GameInterface:
         self.show_evolution_button.add_class('custom-button')
         self.show_evolution_button.on_click(self.on_show_evolution)
 
-        with open('game_config.json', 'r') as f:
-            config = json.load(f)
+        config = load_json_config('game_config.json')
         self.action_buttons = []
-        displayed_actions = random.sample(config['action_options'], 5)
+        displayed_actions = self.game.rng.stream('interface').sample(config['action_options'], 5)
         for action in displayed_actions:
             button = widgets.Button(
                 description=f"{action['text']} ({action['intent']})",
@@ -469,7 +1282,7 @@ class GameInterface:
             layout=Layout(width='100%', height='320px')
         )
 
-        self.status_output = widgets.Output(layout=Layout(width='100%'))
+        self.status_panel = StatusPanel(self.game.config.status_refresh_hz, self.game.instrumentation)
 
         self.viz_output = widgets.Output(layout=Layout(width='100%', height='500px', border=f'1px solid {COLOR_SCHEME["text"]}'))
 
@@ -492,7 +1305,7 @@ class GameInterface:
 
         title = widgets.HTML(value=f"<h1 style='color: {COLOR_SCHEME['text']}; text-align: center; text-shadow: 2px 2px 4px #000000;'>Decisions n Dialogue</h1>")
         
-        status_box = widgets.Box([self.status_output], layout=Layout(width='100%'), 
+        status_box = widgets.Box([self.status_panel.container], layout=Layout(width='100%'), 
                                  style={'background-color': 'rgba(0, 0, 0, 0.7)', 'padding': '10px', 'border-radius': '5px'})
         
         action_box = VBox(self.action_buttons, layout=Layout(width='100%', align_items='stretch'))
@@ -545,18 +1358,7 @@ class GameInterface:
         else:
             action_text = action.description.split(' (')[0]
         self.animate_character("player")
-        
-        with open('player_actions.json', 'r') as f:
-            actions = json.load(f)
-        
-        if action_text in actions:
-            self.log(actions[action_text]['message'], 'player')
-            for effect in actions[action_text]['effects']:
-                setattr(self.game.config, effect['attribute'], effect['value'])
-        else:
-            self.log(f"Unknown action: {action_text}", 'system')
-
-        self.game.logic.interact(action_text)
+        self.game.logic.player_action(action_text)
 
         # Check if the game should end after each action
         if not self.game.running:
@@ -565,6 +1367,7 @@ class GameInterface:
     def on_quit(self, b):
         self.log("Thanks for playing!")
         self.game.running = False
+        self.game.log_store.flush()
         self.disable_action_buttons()
 
     def disable_action_buttons(self):
@@ -572,64 +1375,45 @@ class GameInterface:
             button.disabled = True
         self.quit_button.disabled = True
 
-    def log(self, message, message_type='system'):
+    def format_log_entry(self, message, message_type):
         if message_type == 'player':
-            formatted_message = f'<p class="player-action"><strong style="color: #4CAF50;">You:</strong> <span style="color: white;">{message}</span></p>'
+            return f'<p class="player-action"><strong style="color: #4CAF50;">You:</strong> <span style="color: white;">{message}</span></p>'
         elif message_type == 'npc':
-            formatted_message = f'<p class="npc-action"><strong style="color: #FF9800;">{self.game.npc.name}:</strong> <span style="color: white;">{message}</span></p>'
+            return f'<p class="npc-action"><strong style="color: #FF9800;">{self.game.npc.name}:</strong> <span style="color: white;">{message}</span></p>'
         else:
-            formatted_message = f'<p class="system-message"><strong style="color: #2196F3;">Narrator:</strong> <span style="color: white;">{message}</span></p>'
+            return f'<p class="system-message"><strong style="color: #2196F3;">Narrator:</strong> <span style="color: white;">{message}</span></p>'
 
-        current_log = self.log_output.value
-        updated_log = current_log.replace('</div>', f'{formatted_message}</div>')
-        self.log_output.value = updated_log
-
-        self.game_log.append(message)
+    def log(self, message, message_type='system'):
+        with self.game.instrumentation.phase('log'):
+            self.game.log_store.append(message, message_type)
+            # The widget shows only the newest entries, so its HTML stays bounded
+            entries = self.game.log_store.recent(self.game.config.log_display_entries)
+            formatted = ''.join(self.format_log_entry(entry[3], entry[2]) for entry in entries)
+            self.log_output.value = f'<div id="game-log" class="game-log">{formatted}</div>'
+        self.game.instrumentation.count('log_messages')
+        self.game.instrumentation.count('log_bytes', len(message))
 
     def update_status(self):
-        status_html = f"""
-        <div style="display: flex; justify-content: space-around; align-items: center; background-color: rgba(0, 0, 0, 0.7); padding: 10px; border-radius: 5px; color: {COLOR_SCHEME['text']};">
-            <div style="width: 200px; margin-right: 20px;">
-                <div style="font-size: 14px;">Player Health</div>
-                <div style="background-color: #ddd; border-radius: 10px; overflow: hidden;">
-                    <div style="width: {self.game.config.player_health}%; height: 20px; background-color: #4CAF50; border-radius: 10px;"></div>
-                </div>
-            </div>
-            <div style="margin-right: 20px;">Time of Day: {self.game.config.time_of_day}</div>
-            <div style="margin-right: 20px;">Location: {self.game.config.location}</div>
-            <div style="margin-right: 20px;">Player has item: {'Yes' if self.game.config.player_has_item else 'No'}</div>
-            <div style="width: 200px;">
-                <div style="font-size: 14px;">NPC Health</div>
-                <div style="background-color: #ddd; border-radius: 10px; overflow: hidden;">
-                    <div style="width: {self.game.npc.health}%; height: 20px; background-color: #FF9800; border-radius: 10px;"></div>
-                </div>
-            </div>
-        </div>
-        """
-        self.status_output.clear_output(wait=True)
-        with self.status_output:
-            display(HTML(status_html))
+        with self.game.instrumentation.phase('update_status'):
+            self.status_panel.update(
+                player_health=self.game.config.player_health,
+                time_of_day=self.game.config.time_of_day,
+                location=self.game.config.location,
+                player_has_item=bool(self.game.config.player_has_item),
+                npc_health=self.game.npc.health,
+            )
 
     def on_show_evolution(self, b):
         self.game.visualization.visualize_npc_evolution()
 
     def on_show_tree(self, b):
-        with self.viz_output:
-            clear_output(wait=True)
-            fig = self.game.npc.visualize_decision_tree()
-            fig.show()
+        self.game.visualization.show_figure('tree', self.viz_output)
 
     def on_show_metrics(self, b):
-        with self.viz_output:
-            clear_output(wait=True)
-            fig = self.game.npc.plot_performance_metrics()
-            fig.show()
+        self.game.visualization.show_figure('metrics', self.viz_output)
 
     def on_show_importance(self, b):
-        with self.viz_output:
-            clear_output(wait=True)
-            fig = self.game.npc.plot_feature_importance()
-            fig.show()
+        self.game.visualization.show_figure('importance', self.viz_output)
 
     def animate_character(self, character):
         if character == "player" and not self.player_animating:
@@ -653,17 +1437,446 @@ class GameInterface:
                 import threading
                 threading.Timer(0.3, reset_npc_animation).start()
 
+class HeadlessInterface:
+    # Stand-in for GameInterface when a game runs without a notebook frontend,
+    # e.g. behind GameServer. Messages only go to the game's log store.
+    def __init__(self, game):
+        self.game = game
+        config = load_json_config('game_config.json')
+        self.actions = [action['text'] for action in config['action_options']]
+
+    def log(self, message, message_type='system'):
+        self.game.log_store.append(message, message_type)
+        self.game.instrumentation.count('log_messages')
+        self.game.instrumentation.count('log_bytes', len(message))
+
+    def animate_character(self, character):
+        pass
+
+    def update_status(self):
+        pass
+
+    def disable_action_buttons(self):
+        pass
+
+def flatten_tree(clf, start=0):
+    # A fitted tree as flat node arrays, with child indices offset by start.
+    # Leaves point at themselves, so a traversal can keep stepping past them.
+    tree = clf.tree_
+    leaf = tree.children_left == -1
+    own = np.arange(start, start + tree.node_count)
+    return {
+        'feature': np.where(leaf, 0, tree.feature),
+        'threshold': tree.threshold,
+        'left': np.where(leaf, own, tree.children_left + start),
+        'right': np.where(leaf, own, tree.children_right + start),
+        'leaf': leaf,
+        'label': clf.classes_[tree.value[:, 0, :].argmax(axis=1)],
+    }
+
+def traverse_trees(nodes, node, X, max_depth):
+    # Moves every row from its start node down to a leaf one tree level at a
+    # time. Same comparisons as sklearn: float32 features against float64 thresholds.
+    X = np.asarray(X, dtype=np.float32)
+    rows = np.arange(len(X))
+    for _ in range(max_depth):
+        if nodes.leaf[node].all():
+            break
+        goes_left = X[rows, nodes.feature[node]] <= nodes.threshold[node]
+        node = np.where(goes_left, nodes.left[node], nodes.right[node])
+    return nodes.label[node]
+
+class TreeBank:
+    # Fitted decision trees of many NPCs packed into shared node arrays. Each
+    # tree occupies a contiguous slice and each key (an NPC name) points at the
+    # root of its tree, so all NPCs are decided in one level-by-level traversal
+    # over numpy arrays instead of one sklearn call per tree. Keys sharing a
+    # model share its slice. Replacing a key's model rewrites only that slice,
+    # or a free one if the new tree does not fit there.
+    def __init__(self, capacity=1024):
+        self.feature = np.zeros(capacity, dtype=np.int64)
+        self.threshold = np.zeros(capacity, dtype=np.float64)
+        self.left = np.zeros(capacity, dtype=np.int64)  # leaves point at themselves
+        self.right = np.zeros(capacity, dtype=np.int64)
+        self.leaf = np.zeros(capacity, dtype=bool)
+        self.label = np.zeros(capacity, dtype=np.int64)
+        self.used = 0  # nodes allocated at the end of the arrays
+        self.free = []  # [start, size] of released slices
+        self.slots = {}  # id(clf) -> [start, size, clf, number of keys]
+        self.keys = {}  # key -> id(clf)
+        self.roots = {}  # key -> root offset
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def model(self, key):
+        return self.slots[self.keys[key]][2]
+
+    def set(self, key, clf):
+        model_id = self.keys.get(key)
+        if model_id == id(clf):
+            return
+        if model_id is not None:
+            self.release(key)
+        slot = self.slots.get(id(clf))
+        if slot is None:
+            slot = self.slots[id(clf)] = [self.write(clf), clf.tree_.node_count, clf, 0]
+        slot[3] += 1
+        self.keys[key] = id(clf)
+        self.roots[key] = slot[0]
+
+    def release(self, key):
+        del self.roots[key]
+        slot = self.slots[self.keys.pop(key)]
+        slot[3] -= 1
+        if slot[3] == 0:
+            del self.slots[id(slot[2])]
+            self.free.append([slot[0], slot[1]])
+            if sum(size for _, size in self.free) > self.used // 2:
+                self.compact()
+
+    def allocate(self, size):
+        for block in self.free:
+            if block[1] >= size:
+                start = block[0]
+                block[0] += size
+                block[1] -= size
+                if block[1] == 0:
+                    self.free.remove(block)
+                return start
+        if self.used + size > len(self.feature):
+            self.grow(max(2 * len(self.feature), self.used + size))
+        start = self.used
+        self.used += size
+        return start
+
+    def grow(self, capacity):
+        for name in ('feature', 'threshold', 'left', 'right', 'leaf', 'label'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.used] = old[:self.used]
+            setattr(self, name, new)
+
+    def write(self, clf, start=None):
+        size = clf.tree_.node_count
+        start = self.allocate(size) if start is None else start
+        for name, values in flatten_tree(clf, start).items():
+            getattr(self, name)[start:start + size] = values
+        self.max_depth = max(self.max_depth, clf.tree_.max_depth)
+        return start
+
+    def compact(self):
+        # Rewrites the live trees back to back; roots move, keys do not
+        slots = list(self.slots.values())
+        self.used = 0
+        self.free = []
+        self.max_depth = 0
+        for slot in slots:
+            slot[0] = self.write(slot[2])
+        for key, model_id in self.keys.items():
+            self.roots[key] = self.slots[model_id][0]
+
+    def predict(self, keys, X):
+        roots = np.fromiter((self.roots[key] for key in keys), dtype=np.int64, count=len(X))
+        return traverse_trees(self, roots, X, self.max_depth)
+
+def _attach_shared_memory(name):
+    # Before Python 3.13 attaching registers the segment with the resource
+    # tracker. Processes started by multiprocessing share the publisher's
+    # tracker, which forgets the segment when the publisher unlinks it.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+class SharedModelPublisher:
+    # Publishes the current version of a decision tree to other processes
+    # through shared memory. Each version is written once, as flat node arrays
+    # in a new segment. A small control segment holds the current version and
+    # segment name behind a sequence counter that is odd while they change, so
+    # readers pick up a version atomically and map its arrays without copying.
+    # The newest `retain` segments are kept; older ones are unlinked, which
+    # leaves readers that still map them unaffected.
+    CONTROL = np.dtype([('sequence', np.uint64), ('version', np.uint64), ('nodes', np.uint64),
+                        ('max_depth', np.uint64), ('segment', 'S64')])
+    FIELDS = (('feature', np.int64), ('threshold', np.float64), ('left', np.int64),
+              ('right', np.int64), ('label', np.int64), ('leaf', np.bool_))
+
+    def __init__(self, name=None, retain=2):
+        self.name = name if name is not None else f"dd_{uuid.uuid4().hex[:12]}"
+        self.retain = retain
+        self.control_segment = shared_memory.SharedMemory(name=self.name, create=True, size=self.CONTROL.itemsize)
+        self.control = np.ndarray((), dtype=self.CONTROL, buffer=self.control_segment.buf)
+        self.control[()] = (0, 0, 0, 0, b'')
+        self.segments = deque()
+        self.version = 0
+
+    @classmethod
+    def layout(cls, nodes):
+        # (field, dtype, byte offset) of each node array in a model segment
+        offset = 0
+        fields = []
+        for field, dtype in cls.FIELDS:
+            fields.append((field, dtype, offset))
+            offset += nodes * np.dtype(dtype).itemsize
+        return fields, offset
+
+    def publish(self, clf):
+        flat = flatten_tree(clf)
+        nodes = clf.tree_.node_count
+        fields, size = self.layout(nodes)
+        version = self.version + 1
+        segment = shared_memory.SharedMemory(name=f"{self.name}_{version}", create=True, size=size)
+        for field, dtype, offset in fields:
+            np.ndarray(nodes, dtype=dtype, buffer=segment.buf, offset=offset)[:] = flat[field]
+        control = self.control
+        control['sequence'] += 1
+        control['version'] = version
+        control['nodes'] = nodes
+        control['max_depth'] = clf.tree_.max_depth
+        control['segment'] = segment.name.encode('ascii')
+        control['sequence'] += 1
+        self.version = version
+        self.segments.append(segment)
+        while len(self.segments) > self.retain:
+            old = self.segments.popleft()
+            old.close()
+            old.unlink()
+        return version
+
+    def close(self):
+        while self.segments:
+            segment = self.segments.popleft()
+            segment.close()
+            segment.unlink()
+        del self.control
+        self.control_segment.close()
+        self.control_segment.unlink()
+
+class SharedModelReader:
+    # A worker process's view of a SharedModelPublisher. refresh() is one read
+    # of the control segment while the version is unchanged; a new version is
+    # attached by name and its node arrays are used in place.
+    def __init__(self, name):
+        self.control_segment = _attach_shared_memory(name)
+        self.control = np.ndarray((), dtype=SharedModelPublisher.CONTROL, buffer=self.control_segment.buf)
+        self.version = 0
+        self.segment = None
+        self.nodes = None
+        self.max_depth = 0
+
+    def refresh(self):
+        control = self.control
+        while True:
+            sequence = int(control['sequence'])
+            version = int(control['version'])
+            if version == self.version and sequence % 2 == 0:
+                return version
+            if sequence % 2:
+                continue
+            nodes = int(control['nodes'])
+            max_depth = int(control['max_depth'])
+            name = control['segment'].item().decode('ascii')
+            if int(control['sequence']) != sequence:
+                continue
+            try:
+                segment = _attach_shared_memory(name)
+            except FileNotFoundError:
+                continue  # superseded and unlinked meanwhile; read the control again
+            fields, _ = SharedModelPublisher.layout(nodes)
+            self.nodes = SimpleNamespace(**{field: np.ndarray(nodes, dtype=dtype, buffer=segment.buf, offset=offset)
+                                            for field, dtype, offset in fields})
+            if self.segment is not None:
+                self.segment.close()
+            self.segment = segment
+            self.max_depth = max_depth
+            self.version = version
+            return version
+
+    def predict(self, X):
+        if self.refresh() == 0:
+            raise RuntimeError("No model has been published yet")
+        return traverse_trees(self.nodes, np.zeros(len(X), dtype=np.int64), X, self.max_depth)
+
+    def close(self):
+        self.nodes = None
+        if self.segment is not None:
+            self.segment.close()
+        del self.control
+        self.control_segment.close()
+
+class NPCRegistry:
+    # The world's NPCs partitioned by location, each optionally active only at
+    # some times of day. A turn decides only for the NPCs where the player is,
+    # all of them in one TreeBank traversal, so a turn costs in proportion to
+    # the local population, not the world's.
+    def __init__(self):
+        self.npcs = {}  # name -> NPC
+        self.tree_bank = TreeBank()
+        self.locations = {}  # name -> location
+        self.active_times = {}  # name -> set of times of day, None when always active
+        self.partitions = {}  # location -> {name: NPC} in the order they arrived
+
+    def __len__(self):
+        return len(self.npcs)
+
+    def __contains__(self, name):
+        return name in self.npcs
+
+    def add(self, npc, location, active_times=None):
+        if npc.name in self.npcs:
+            raise ValueError(f"An NPC named {npc.name} is already registered")
+        self.npcs[npc.name] = npc
+        self.active_times[npc.name] = set(active_times) if active_times is not None else None
+        self.locations[npc.name] = location
+        self.partitions.setdefault(location, {})[npc.name] = npc
+        self.tree_bank.set(npc.name, npc.decision_tree.clf)
+
+    def remove(self, name):
+        npc = self.npcs.pop(name)
+        self.tree_bank.release(name)
+        del self.active_times[name]
+        del self.partitions[self.locations.pop(name)][name]
+        return npc
+
+    def move(self, name, location):
+        npc = self.partitions[self.locations[name]].pop(name)
+        self.locations[name] = location
+        self.partitions.setdefault(location, {})[name] = npc
+
+    def local(self, location, time_of_day=None):
+        partition = self.partitions.get(location, {})
+        if time_of_day is None:
+            return list(partition.values())
+        return [npc for name, npc in partition.items()
+                if self.active_times[name] is None or time_of_day in self.active_times[name]]
+
+    def decide(self, npcs, player_friendly, player_has_item, time_of_day, location):
+        # Returns (npc, features, action) in the order of npcs. The shared context
+        # differs per NPC only in its own health and mood.
+        if not npcs:
+            return []
+        for npc in npcs:
+            # An NPC that evolved since its last decision gets its new tree written
+            self.tree_bank.set(npc.name, npc.decision_tree.clf)
+        features = [npc.decision_tree.encode_features(player_friendly, player_has_item, time_of_day, location, npc.health, npc.mood)
+                    for npc in npcs]
+        actions = self.tree_bank.predict([npc.name for npc in npcs], features)
+        return list(zip(npcs, features, actions.tolist()))
+
+ScheduledEvent = namedtuple('ScheduledEvent', ['turn', 'priority', 'seq', 'kind', 'target', 'payload'])
+
+class EventScheduler:
+    # Min-heap of world events keyed by (turn, priority, seq). A tick pops only
+    # the events that are due, so its cost follows the number of events that
+    # fire rather than the number of NPCs that could fire. Events on the same
+    # turn run by priority, then in the order they were scheduled. Cancelled
+    # events stay in the heap and are dropped when they reach the top. `live`
+    # holds the seqs that are pending and not cancelled, so cancelling an event
+    # that already fired, was cancelled or never existed does nothing.
+    PRIORITIES = {'npc_evolution': 0, 'environment_change': 1, 'respawn': 2, 'cooldown': 3}
+
+    def __init__(self):
+        self.heap = []
+        self.handlers = {}
+        self.live = set()
+        self.cancelled = set()
+        self.next_seq = 0
+
+    def __len__(self):
+        return len(self.live)
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def schedule(self, turn, kind, target=None, payload=None):
+        event = ScheduledEvent(turn, self.PRIORITIES.get(kind, len(self.PRIORITIES)), self.next_seq, kind, target, payload)
+        self.next_seq += 1
+        heapq.heappush(self.heap, event)
+        self.live.add(event.seq)
+        return event.seq
+
+    def cancel(self, seq):
+        if seq in self.live:
+            self.live.remove(seq)
+            self.cancelled.add(seq)
+
+    def next_turn(self):
+        while self.heap and self.heap[0].seq in self.cancelled:
+            self.cancelled.discard(heapq.heappop(self.heap).seq)
+        return self.heap[0].turn if self.heap else None
+
+    def run_due(self, turn):
+        fired = 0
+        while self.heap and self.heap[0].turn <= turn:
+            event = heapq.heappop(self.heap)
+            if event.seq in self.cancelled:
+                self.cancelled.discard(event.seq)
+                continue
+            self.live.discard(event.seq)
+            self.handlers[event.kind](event)
+            fired += 1
+        return fired
+
 class GameLogic:
     def __init__(self, game):
         self.game = game
+        self.scheduler = EventScheduler()
+        self.scheduler.register('npc_evolution', self.on_npc_evolution)
+        self.scheduler.register('environment_change', self.on_environment_change)
+        self.scheduler.register('respawn', self.on_respawn)
+        self.scheduler.register('cooldown', self.on_cooldown_end)
+        self.local_decisions = []  # (npc name, action, response) of each world NPC that acted this turn
+        self.schedule_evolution(game.npc)
+        self.scheduler.schedule(game.config.turn_count + game.config.environment_change_turns, 'environment_change')
+
+    def player_action(self, action_text):
+        actions = load_json_config('player_actions.json')
+        
+        if action_text in actions:
+            self.game.interface.log(actions[action_text]['message'], 'player')
+            for effect in actions[action_text]['effects']:
+                setattr(self.game.config, effect['attribute'], effect['value'])
+        else:
+            self.game.interface.log(f"Unknown action: {action_text}", 'system')
+
+        self.interact(action_text)
+        self.game.recorder.record(action_text, self.game.npc.last_action, self.game.npc.last_response, self.local_decisions)
 
     def interact(self, player_action):
-        npc_response = self.game.npc.interact(player_action, self.game.config.player_friendly, self.game.config.player_has_item,
-                                               self.game.config.time_of_day, self.game.config.location)
-        self.game.interface.log(npc_response, 'npc')
-        self.game.interface.animate_character("npc")
-        self.handle_npc_response(npc_response)
-        self.update_game_state()
+        instrumentation = self.game.instrumentation
+        self.local_decisions = []
+        instrumentation.begin_turn()
+        try:  # a profiled turn holds the profile gate until end_turn
+            with instrumentation.phase('turn'):
+                with instrumentation.phase('npc_interact'):
+                    npc_response = self.game.npc.interact(player_action, self.game.config.player_friendly, self.game.config.player_has_item,
+                                                           self.game.config.time_of_day, self.game.config.location)
+                self.game.interface.log(npc_response, 'npc')
+                self.game.interface.animate_character("npc")
+                with instrumentation.phase('handle_npc_response'):
+                    self.handle_npc_response(npc_response)
+                if self.game.registry:
+                    with instrumentation.phase('local_npcs'):
+                        self.tick_local_npcs(player_action)
+                with instrumentation.phase('update_game_state'):
+                    self.update_game_state()
+        finally:
+            instrumentation.end_turn()
+
+    def tick_local_npcs(self, player_action):
+        config = self.game.config
+        npcs = self.game.registry.local(config.location, config.time_of_day)
+        decisions = self.game.registry.decide(npcs, config.player_friendly, config.player_has_item, config.time_of_day, config.location)
+        for npc, features, action in decisions:
+            response = npc.respond(player_action, features, action)
+            self.local_decisions.append((npc.name, action, response))
+            self.game.interface.log(response, 'npc')
+            self.handle_npc_response(response)
+        self.game.instrumentation.count('local_npc_decisions', len(decisions))
 
     def handle_npc_response(self, response):
         if any(keyword in response.lower() for keyword in self.game.config.attack_keywords):
@@ -675,14 +1888,7 @@ class GameLogic:
 
     def update_game_state(self):
         self.game.config.turn_count += 1
-        if self.game.config.turn_count % self.game.config.npc_evolution_turns == 0:
-            self.game.npc.update_decision_tree()
-            self.game.interface.log("The NPC's behavior has evolved!")
-            self.game.visualization.show_npc_evolution()
-        if self.game.config.turn_count % self.game.config.environment_change_turns == 0:
-            self.game.config.time_of_day = random.choice(self.game.config.time_options)
-            self.game.config.location = random.choice(self.game.config.location_options)
-            self.game.interface.log(f"You've moved to the {self.game.config.location} and time has passed. It's now {self.game.config.time_of_day}.")
+        self.scheduler.run_due(self.game.config.turn_count)
         if self.game.config.player_health <= 0:
             self.game.interface.log("Game Over! You have been defeated.")
             self.game.running = False
@@ -691,10 +1897,123 @@ class GameLogic:
             self.game.running = False
         self.game.interface.update_status()
 
+    def schedule_evolution(self, npc, turn=None):
+        # The payload is the NPC's interaction count, so an NPC the player has
+        # not met since its last evolution is not retrained on the same rows
+        turn = turn if turn is not None else self.game.config.turn_count
+        return self.scheduler.schedule(turn + self.game.config.npc_evolution_turns, 'npc_evolution', npc,
+                                       npc.decision_tree.interaction_history.total)
+
+    def on_npc_evolution(self, event):
+        npc = event.target
+        if npc.decision_tree.interaction_history.total != event.payload:
+            with self.game.instrumentation.phase('retrain'):
+                npc.update_decision_tree()
+            self.game.instrumentation.count('retrains')
+            if npc is self.game.npc:
+                self.game.visualization.refresh_figures()
+                self.game.interface.log("The NPC's behavior has evolved!")
+                self.game.visualization.show_npc_evolution()
+        self.schedule_evolution(npc, event.turn)
+
+    def on_environment_change(self, event):
+        self.game.config.time_of_day = self.game.config.rng.choice(self.game.config.time_options)
+        self.game.config.location = self.game.config.rng.choice(self.game.config.location_options)
+        self.game.interface.log(f"You've moved to the {self.game.config.location} and time has passed. It's now {self.game.config.time_of_day}.")
+        self.scheduler.schedule(event.turn + self.game.config.environment_change_turns, 'environment_change')
+
+    def schedule_respawn(self, npc, turns):
+        return self.scheduler.schedule(self.game.config.turn_count + turns, 'respawn', npc)
+
+    def on_respawn(self, event):
+        npc = event.target
+        npc.health = npc.config.health
+        npc.cooldowns.clear()
+        self.game.interface.log(f"{npc.name} has returned.")
+
+    def start_cooldown(self, npc, name, turns):
+        npc.cooldowns.add(name)
+        return self.scheduler.schedule(self.game.config.turn_count + turns, 'cooldown', npc, name)
+
+    def on_cooldown_end(self, event):
+        event.target.cooldowns.discard(event.payload)
+
+class FigureCache:
+    # Builds every visualization figure on a worker thread as soon as a model
+    # version exists and keeps the plotly JSON of the latest version, so the
+    # visualization buttons only display a finished result. The first build is
+    # submitted while the game is still being constructed, so the cache is handed
+    # its GameVisualization rather than finding it through game.
+    def __init__(self, game, visualization):
+        self.game = game
+        self.visualization = visualization
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.version = None
+        self.future = None
+
+    def snapshot(self):
+        # Everything the figures read, captured on the game thread. clf is
+        # replaced rather than refitted on retrain, so it is safe to share.
+        decision_tree = self.game.npc.decision_tree
+        return SimpleNamespace(
+            clf=decision_tree.clf,
+            accuracy_history=list(decision_tree.accuracy_history),
+            tree_depth_history=list(decision_tree.tree_depth_history),
+            action_distribution=decision_tree.get_action_distribution(),
+        )
+
+    def refresh(self):
+        version = self.game.npc.decision_tree.model_version
+        if version != self.version:
+            self.version = version
+            self.future = self.executor.submit(self.build, self.snapshot())
+        return self.future
+
+    def build(self, model):
+        instrumentation = self.game.instrumentation
+        with instrumentation.phase('figure_build'):
+            visualizer = NPCVisualizer(model)
+            figures = {
+                'tree': visualizer.visualize_decision_tree(),
+                'metrics': visualizer.plot_performance_metrics(),
+                'importance': visualizer.plot_feature_importance(),
+                'evolution': self.visualization.build_evolution_figure(model.action_distribution),
+            }
+            figures = {kind: json.loads(pio.to_json(fig, validate=False)) for kind, fig in figures.items()}
+        instrumentation.count('figure_builds', len(figures))
+        return figures
+
+    def get(self, kind):
+        # Blocks only while the current version is still being built
+        return self.refresh().result()[kind]
+
+    def close(self):
+        self.executor.shutdown()
+
 class GameVisualization:
     def __init__(self, game):
         self.game = game
-        self.viz_output = widgets.Output(layout=Layout(width='100%', height='500px', border=f'1px solid {self.game.config.COLOR_SCHEME["text"]}'))
+        if self.game.headless:
+            self.viz_output = None
+            self.figure_cache = None
+        else:
+            self.viz_output = widgets.Output(layout=Layout(width='100%', height='500px', border=f'1px solid {self.game.config.COLOR_SCHEME["text"]}'))
+            self.figure_cache = FigureCache(game, self)
+            self.figure_cache.refresh()
+
+    def refresh_figures(self):
+        if self.figure_cache is not None:
+            self.figure_cache.refresh()
+
+    def display_output(self, figure):
+        # A single outputs assignment replaces the previous figure and, unlike
+        # `with output:`, works from the figure worker thread too
+        return ({'output_type': 'display_data', 'metadata': {},
+                 'data': {'application/vnd.plotly.v1+json': figure, 'text/plain': "<Figure>"}},)
+
+    def show_figure(self, kind, output):
+        with self.game.instrumentation.phase('figure_display'):
+            output.outputs = self.display_output(self.figure_cache.get(kind))
 
     def show_npc_evolution(self):
         action_dist = self.game.npc.get_action_distribution()
@@ -707,31 +2026,79 @@ class GameVisualization:
         self.visualize_npc_evolution()
 
     def visualize_npc_evolution(self, width=800, height=600):
-        with self.viz_output:
-            clear_output(wait=True)
-            action_dist = self.game.npc.get_action_distribution()
-            fig = go.Figure(data=[go.Bar(x=list(action_dist.keys()), y=list(action_dist.values()))])
-            fig.update_layout(
-                title="NPC Action Distribution",
-                xaxis_title="Actions",
-                yaxis_title="Probability",
-                paper_bgcolor=self.game.config.COLOR_SCHEME['background'],
-                plot_bgcolor=self.game.config.COLOR_SCHEME['background'],
-                font=dict(color=self.game.config.COLOR_SCHEME['text']),
-                width=width,
-                height=height
-            )
-            fig.show()
+        if self.viz_output is None:
+            return
+        if (width, height) != (800, 600):
+            with self.viz_output:
+                clear_output(wait=True)
+                self.game.instrumentation.count('figure_builds')
+                self.build_evolution_figure(self.game.npc.get_action_distribution(), width, height).show()
+            return
+        # Display once the worker has built this version, without blocking the turn
+        future = self.figure_cache.refresh()
+        future.add_done_callback(
+            lambda done: setattr(self.viz_output, 'outputs', self.display_output(done.result()['evolution'])))
+
+    def build_evolution_figure(self, action_dist, width=800, height=600):
+        fig = go.Figure(data=[go.Bar(x=list(action_dist.keys()), y=list(action_dist.values()))])
+        fig.update_layout(
+            title="NPC Action Distribution",
+            xaxis_title="Actions",
+            yaxis_title="Probability",
+            paper_bgcolor=self.game.config.COLOR_SCHEME['background'],
+            plot_bgcolor=self.game.config.COLOR_SCHEME['background'],
+            font=dict(color=self.game.config.COLOR_SCHEME['text']),
+            width=width,
+            height=height
+        )
+        return fig
 
 class Game:
-    def __init__(self):
-        self.config = GameConfig()
-        self.npc = NPC("Guardian")
+    def __init__(self, headless=False, npc=None, instrumentation=None, rng=None, world_npcs=None, model_search=None):
+        # An NPC passed in should be built from the same rng for the session to replay.
+        # world_npcs defaults to the config's list of world NPC specs. A model_search
+        # passed in is shared with other games and is not closed by this one.
+        self.headless = headless
+        self.rng = rng if rng is not None else SessionRNG()
+        self.recorder = SessionRecorder(self.rng.seed)
+        self.instrumentation = instrumentation if instrumentation is not None else TurnInstrumentation()
+        self.config = GameConfig(self.rng.stream('world'))
+        spill_path = None
+        if self.config.log_spill_dir is not None:
+            os.makedirs(self.config.log_spill_dir, exist_ok=True)
+            spill_path = os.path.join(self.config.log_spill_dir, f"game_log_{self.rng.seed}_{uuid.uuid4().hex[:8]}.jsonl.gz")
+        self.log_store = GameLogStore(self.config.log_retention, spill_path)
+        self.owns_model_search = model_search is None
+        if model_search is None:
+            settings = load_json_config('npc_config.json').get('model_search')
+            model_search = ModelSizeSearch(**settings) if settings else None
+        self.model_search = model_search  # one search and worker pool for all of the game's NPCs
+        self.npc = npc if npc is not None else NPC("Guardian", rng=self.rng, model_search=self.model_search)
+        self.npc.instrumentation = self.instrumentation
+        self.registry = NPCRegistry()
         self.logic = GameLogic(self)
+        for spec in world_npcs if world_npcs is not None else self.config.world_npcs:
+            self.add_npc(spec['name'], spec['location'], spec.get('active_times'))
         self.visualization = GameVisualization(self)
         self.running = True
-        self.game_log = []  # Initialize game_log here
-        self.interface = GameInterface(self)
+        self.interface = HeadlessInterface(self) if headless else GameInterface(self)
+
+    def add_npc(self, name, location, active_times=None):
+        # World NPCs start from the main NPC's model and training data and evolve
+        # on their own from there; each gets its own seeded streams
+        npc = NPC(name, training_data=copy.copy(self.npc.training_data), clf=self.npc.decision_tree.clf,
+                  rng=SessionRNG(f"{self.rng.seed}:{name}"), model_search=self.model_search)
+        npc.instrumentation = self.instrumentation
+        self.registry.add(npc, location, active_times)
+        self.logic.schedule_evolution(npc)
+        return npc
+
+    def close(self):
+        self.log_store.close()
+        if self.visualization.figure_cache is not None:
+            self.visualization.figure_cache.close()
+        if self.owns_model_search and self.model_search is not None:
+            self.model_search.close()
 
     def start(self):
         self.interface.log("Welcome to 'Decisions n Dialogue'! You encounter the Guardian in the forest.")
@@ -740,6 +2107,1366 @@ class Game:
         self.start()
        
 
+class MemoryReport:
+    # Bytes held by a game's main subsystems, two ways. `subsystems` are
+    # estimates walked from the objects that hold them (sys.getsizeof plus array
+    # buffers), available at any time. While tracemalloc is tracing,
+    # `traced_subsystems` attributes each live traced allocation to the subsystem
+    # whose code made it, by the innermost frame that falls in one of SITES, and
+    # `other` is the traced total they do not cover. Traced figures cover the
+    # whole process, e.g. every session of a server. Only allocations made after
+    # start() are traced, and attribution needs enough frames to get from numpy
+    # or plotly internals back to this file.
+    SITES = {
+        'log': (GameLogStore, HeadlessInterface.log, GameInterface.log, GameInterface.format_log_entry),
+        'training_data': (NPCTrainingData, TrainingDataLoader),
+        'interaction_history': (InteractionHistory,),
+        'figures': (NPCVisualizer, FigureCache, GameVisualization),
+    }
+    _site_lines = None
+
+    @staticmethod
+    def start(frames=25):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @classmethod
+    def site_lines(cls):
+        # (filename, lineno) -> subsystem, for every line of every function in SITES
+        if cls._site_lines is None:
+            lines = {}
+            for subsystem, sites in cls.SITES.items():
+                functions = []
+                for site in sites:
+                    functions.extend(vars(site).values() if isinstance(site, type) else [site])
+                codes = [function.__code__ for function in functions if hasattr(function, '__code__')]
+                while codes:
+                    code = codes.pop()
+                    codes.extend(const for const in code.co_consts if hasattr(const, 'co_lines'))  # nested functions
+                    for _, _, lineno in code.co_lines():
+                        if lineno is not None:
+                            lines[(code.co_filename, lineno)] = subsystem
+            cls._site_lines = lines
+        return cls._site_lines
+
+    @staticmethod
+    def deep_size(obj, seen=None):
+        seen = set() if seen is None else seen
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            return sys.getsizeof(obj)  # includes the buffer only when the array owns it
+        size = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            size += sum(MemoryReport.deep_size(k, seen) + MemoryReport.deep_size(v, seen) for k, v in obj.items())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            size += sum(MemoryReport.deep_size(item, seen) for item in obj)
+        return size
+
+    def __init__(self, game):
+        self.game = game
+
+    def subsystems(self):
+        game = self.game
+        log_store = game.log_store
+        log = self.deep_size(log_store.entries) + self.deep_size(log_store.spill_buffer)
+        figures = 0
+        seen = set()  # displayed figures are usually the cached ones
+        if isinstance(game.interface, GameInterface):
+            log += sys.getsizeof(game.interface.log_output.value)
+            figures += self.deep_size(game.interface.viz_output.outputs, seen)
+        if game.visualization.viz_output is not None:
+            figures += self.deep_size(game.visualization.viz_output.outputs, seen)
+        figure_cache = game.visualization.figure_cache
+        if figure_cache is not None and figure_cache.future is not None and figure_cache.future.done():
+            figures += self.deep_size(figure_cache.future.result(), seen)
+        # The player's NPC and every world NPC. Shallow copies of a training set
+        # share its arrays and index, so each object is counted once across NPCs
+        npcs = [game.npc] + [npc for npc in game.registry.npcs.values() if npc is not game.npc]
+        training_seen, history_seen = set(), set()
+        training_data = interaction_history = 0
+        for npc in npcs:
+            data = npc.training_data
+            training_data += sum(self.deep_size(part, training_seen) for part in (data.X, data.y, data.counts, data.index))
+            history = npc.decision_tree.interaction_history
+            interaction_history += self.deep_size(history.records, history_seen) + self.deep_size(history.action_names, history_seen)
+        return {
+            'log': log,
+            'training_data': training_data,
+            'interaction_history': interaction_history,
+            'figures': figures,
+        }
+
+    def traced_subsystems(self, snapshot):
+        site_lines = self.site_lines()
+        traced = dict.fromkeys(self.SITES, 0)
+        for trace in snapshot.traces:
+            for frame in reversed(trace.traceback):  # innermost frame first
+                subsystem = site_lines.get((frame.filename, frame.lineno))
+                if subsystem is not None:
+                    traced[subsystem] += trace.size
+                    break
+        return traced
+
+    def collect(self, top=10):
+        subsystems = self.subsystems()
+        report = {'subsystems': subsystems, 'log_entries_spilled': self.game.log_store.spilled,
+                  'tracing': tracemalloc.is_tracing()}
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            statistics = snapshot.statistics('lineno')
+            total = sum(stat.size for stat in statistics)
+            traced = self.traced_subsystems(snapshot)
+            report['traced_total'] = total
+            report['traced_subsystems'] = traced
+            report['other'] = total - sum(traced.values())
+            report['top_allocations'] = [
+                {'site': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", 'bytes': stat.size}
+                for stat in statistics[:top]
+            ]
+        return report
+
+class SessionRecorder:
+    # Compact log of a session: its seed, a table of distinct player actions and,
+    # per turn, the action code, the NPC's action and a CRC of its response, plus
+    # the name code, action and response CRC of every world NPC that acted.
+    # Replaying the actions from the seed must reproduce the NPCs' parts exactly.
+    def __init__(self, seed):
+        self.seed = seed
+        self.action_names = []
+        self.action_codes = {}
+        self.player_actions = array('H')
+        self.npc_actions = array('b')
+        self.response_crcs = array('I')
+        self.npc_names = []
+        self.npc_codes = {}
+        # World NPC decisions per turn, then each decision; None for a version 1
+        # recording, which predates them and so cannot be checked against them
+        self.local_counts = array('H')
+        self.local_npcs = array('H')
+        self.local_actions = array('b')
+        self.local_crcs = array('I')
+
+    def __len__(self):
+        return len(self.player_actions)
+
+    def record(self, player_action, npc_action, response, local_decisions=()):
+        code = self.action_codes.get(player_action)
+        if code is None:
+            code = self.action_codes[player_action] = len(self.action_names)
+            self.action_names.append(player_action)
+        self.player_actions.append(code)
+        self.npc_actions.append(int(npc_action))
+        self.response_crcs.append(zlib.crc32(response.encode('utf-8')))
+        self.local_counts.append(len(local_decisions))
+        for name, action, local_response in local_decisions:
+            npc_code = self.npc_codes.get(name)
+            if npc_code is None:
+                npc_code = self.npc_codes[name] = len(self.npc_names)
+                self.npc_names.append(name)
+            self.local_npcs.append(npc_code)
+            self.local_actions.append(int(action))
+            self.local_crcs.append(zlib.crc32(local_response.encode('utf-8')))
+
+    def local_turns(self):
+        # Per turn, the (npc name, action, response CRC) of each world NPC that acted
+        offset = 0
+        for count in self.local_counts:
+            yield [(self.npc_names[self.local_npcs[i]], self.local_actions[i], self.local_crcs[i])
+                   for i in range(offset, offset + count)]
+            offset += count
+
+    def to_dict(self):
+        return {
+            'version': 2,
+            'seed': self.seed,
+            'actions': self.action_names,
+            'player_actions': self.player_actions.tolist(),
+            'npc_actions': self.npc_actions.tolist(),
+            'response_crcs': self.response_crcs.tolist(),
+            'npc_names': self.npc_names,
+            'local_counts': self.local_counts.tolist(),
+            'local_npcs': self.local_npcs.tolist(),
+            'local_actions': self.local_actions.tolist(),
+            'local_crcs': self.local_crcs.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') not in (1, 2):
+            raise ValueError(f"Unsupported recording version: {data.get('version')}")
+        recorder = cls(data['seed'])
+        recorder.action_names = list(data['actions'])
+        recorder.action_codes = {name: code for code, name in enumerate(recorder.action_names)}
+        recorder.player_actions = array('H', data['player_actions'])
+        recorder.npc_actions = array('b', data['npc_actions'])
+        recorder.response_crcs = array('I', data['response_crcs'])
+        if data['version'] == 1:
+            recorder.local_counts = None
+            return recorder
+        recorder.npc_names = list(data['npc_names'])
+        recorder.npc_codes = {name: code for code, name in enumerate(recorder.npc_names)}
+        recorder.local_counts = array('H', data['local_counts'])
+        recorder.local_npcs = array('H', data['local_npcs'])
+        recorder.local_actions = array('b', data['local_actions'])
+        recorder.local_crcs = array('I', data['local_crcs'])
+        return recorder
+
+    def save(self, path):
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+class SessionReplayer:
+    # Re-executes a recorded session headlessly and checks every NPC action and
+    # response, the world NPCs' included, against the recording
+    def __init__(self, recording, instrumentation=None):
+        self.recording = recording
+        self.instrumentation = instrumentation
+
+    def run(self, stop_on_mismatch=True):
+        recording = self.recording
+        start = time.perf_counter()
+        game = Game(headless=True, instrumentation=self.instrumentation, rng=SessionRNG(recording.seed))
+        mismatches = []
+        turns = 0
+        local_turns = recording.local_turns() if recording.local_counts is not None else None
+        for turn, code in enumerate(recording.player_actions):
+            game.logic.player_action(recording.action_names[code])
+            turns += 1
+            npc_action = int(game.npc.last_action)
+            response_crc = zlib.crc32(game.npc.last_response.encode('utf-8'))
+            local_matches = True
+            if local_turns is not None:
+                local = [(name, int(action), zlib.crc32(response.encode('utf-8')))
+                         for name, action, response in game.logic.local_decisions]
+                local_matches = local == next(local_turns)
+            if npc_action != recording.npc_actions[turn] or response_crc != recording.response_crcs[turn] or not local_matches:
+                mismatches.append({
+                    'turn': turn,
+                    'expected_npc_action': recording.npc_actions[turn],
+                    'npc_action': npc_action,
+                    'response_matches': response_crc == recording.response_crcs[turn],
+                    'local_npcs_match': local_matches,
+                })
+                if stop_on_mismatch:
+                    break
+        elapsed = time.perf_counter() - start
+        game.close()
+        return {
+            'seed': recording.seed,
+            'turns': turns,
+            'recorded_turns': len(recording),
+            'identical': not mismatches and turns == len(recording),
+            'mismatches': mismatches,
+            'elapsed_s': elapsed,
+            'turns_per_s': turns / elapsed if elapsed else 0.0,
+        }
+
+class GameSnapshot:
+    # Binary checkpoint of a whole game: a magic string, a JSON header that
+    # describes the state, then every numpy array as raw bytes at a 64-byte
+    # aligned offset with a CRC over them. Fitted classifiers are stored as
+    # sklearn's own flat node and value arrays and random streams as their full
+    # state, so a loaded game continues exactly as the saved one would have.
+    # Arrays (and classifiers) shared between NPCs are written once and shared
+    # again after loading. Spilled log segments stay where they are on disk.
+    MAGIC = b'DDSNAP02'
+    ALIGN = 64
+    CONFIG_FIELDS = ('player_health', 'player_friendly', 'player_has_item', 'time_of_day', 'location', 'turn_count')
+
+    def __init__(self, arrays=None):
+        self.arrays = arrays if arrays is not None else []
+        self.array_ids = {}  # id(array) -> position in arrays, while packing
+        self.unpacked = {}  # position -> array, while unpacking
+
+    def pack(self, value):
+        # JSON-compatible copy of value with arrays replaced by references
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise ValueError("Object arrays cannot be stored in a snapshot")
+            position = self.array_ids.get(id(value))
+            if position is None:
+                position = self.array_ids[id(value)] = len(self.arrays)
+                self.arrays.append(value)
+            return {'__array__': position}
+        if isinstance(value, np.generic):
+            return {'__scalar__': np.lib.format.dtype_to_descr(value.dtype), 'value': value.item()}
+        if isinstance(value, tuple):
+            return {'__tuple__': [self.pack(item) for item in value]}
+        if isinstance(value, (set, frozenset)):
+            return {'__set__': [self.pack(item) for item in value]}
+        if isinstance(value, list):
+            return [self.pack(item) for item in value]
+        if isinstance(value, dict):
+            if all(isinstance(key, str) and not key.startswith('__') for key in value):
+                return {key: self.pack(item) for key, item in value.items()}
+            return {'__items__': [[self.pack(key), self.pack(item)] for key, item in value.items()]}
+        return value
+
+    def unpack(self, value):
+        if isinstance(value, list):
+            return [self.unpack(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if '__array__' in value:
+            position = value['__array__']
+            array = self.unpacked.get(position)
+            if array is None:
+                array = self.unpacked[position] = self.arrays[position]
+            return array
+        if '__scalar__' in value:
+            return np.lib.format.descr_to_dtype(value['__scalar__']).type(value['value'])
+        if '__tuple__' in value:
+            return tuple(self.unpack(item) for item in value['__tuple__'])
+        if '__set__' in value:
+            return {self.unpack(item) for item in value['__set__']}
+        if '__items__' in value:
+            return {self.unpack(key): self.unpack(item) for key, item in value['__items__']}
+        return {key: self.unpack(item) for key, item in value.items()}
+
+    @staticmethod
+    def capture_streams(rng):
+        streams = {}
+        for name, stream in sorted(rng.streams.items()):
+            version, internal, gauss_next = stream.getstate()
+            streams[name] = {'version': version, 'internal': np.array(internal, dtype=np.uint32), 'gauss_next': gauss_next}
+        return streams
+
+    @staticmethod
+    def restore_streams(rng, streams):
+        for name, state in streams.items():
+            rng.stream(name).setstate((state['version'], tuple(state['internal'].tolist()), state['gauss_next']))
+
+    @staticmethod
+    def capture_model(clf):
+        state = dict(clf.__getstate__())
+        _, tree_args, tree_state = state.pop('tree_').__reduce__()
+        return {'estimator': state, 'tree_args': tree_args, 'tree': tree_state}
+
+    @staticmethod
+    def restore_model(model):
+        tree = Tree(*model['tree_args'])
+        tree.__setstate__(model['tree'])
+        clf = DecisionTreeClassifier.__new__(DecisionTreeClassifier)
+        clf.__setstate__(dict(model['estimator'], tree_=tree))
+        return clf
+
+    def capture_npc(self, npc, game, models):
+        decision_tree = npc.decision_tree
+        history = decision_tree.interaction_history
+        clf_id = id(decision_tree.clf)
+        if clf_id not in models:
+            models[clf_id] = (len(models), self.capture_model(decision_tree.clf))
+        return {
+            'name': npc.name,
+            'rng': 'game' if npc.rng is game.rng else None if npc.rng is None else {
+                'seed': npc.rng.seed, 'streams': self.capture_streams(npc.rng)},
+            'health': npc.health,
+            'mood': npc.mood,
+            'has_item': npc.has_item,
+            'last_action': npc.last_action,
+            'last_response': npc.last_response,
+            'cooldowns': npc.cooldowns,
+            'training_data': {'path': npc.training_data.path, 'X': npc.training_data.X, 'y': npc.training_data.y,
+                              'counts': npc.training_data.counts},
+            'model': models[clf_id][0],
+            'model_version': decision_tree.model_version,
+            'model_selection_history': decision_tree.model_selection_history,
+            # Metric histories grow with every evolution, so they are stored as arrays
+            'accuracy_history': np.array(decision_tree.accuracy_history, dtype=np.float64),
+            'tree_depth_history': np.array(decision_tree.tree_depth_history, dtype=np.int64),
+            'history': {'capacity': history.capacity, 'records': history.records, 'total': history.total,
+                        'action_names': history.action_names},
+        }
+
+    def restore_npc(self, state, rng, models, indexes):
+        training_data = NPCTrainingData.__new__(NPCTrainingData)
+        training_data.path = state['training_data']['path']
+        training_data.X = state['training_data']['X']
+        training_data.y = state['training_data']['y']
+        training_data.counts = state['training_data']['counts']
+        # The index is derived from X and y; NPCs that still share them share it
+        key = (id(training_data.X), id(training_data.y))
+        if key not in indexes:
+            rows = np.column_stack([training_data.X, training_data.y])
+            indexes[key] = {row.tobytes(): position for position, row in enumerate(rows)}
+        training_data.index = indexes[key]
+        npc = NPC(state['name'], training_data=training_data, clf=models[state['model']], rng=rng)
+        npc.health = state['health']
+        npc.mood = state['mood']
+        npc.has_item = state['has_item']
+        npc.last_action = state['last_action']
+        npc.last_response = state['last_response']
+        npc.cooldowns = state['cooldowns']
+        decision_tree = npc.decision_tree
+        decision_tree.model_version = state['model_version']
+        decision_tree.model_selection_history = state['model_selection_history']
+        decision_tree.accuracy_history = list(state['accuracy_history'])
+        decision_tree.tree_depth_history = state['tree_depth_history'].tolist()
+        history = decision_tree.interaction_history = InteractionHistory(state['history']['capacity'])
+        history.records = state['history']['records']
+        history.total = state['history']['total']
+        history.action_names = state['history']['action_names']
+        history.action_codes = {name: code for code, name in enumerate(history.action_names)}
+        return npc
+
+    def capture(self, game):
+        models = {}
+        registry = game.registry
+        npc = self.capture_npc(game.npc, game, models)
+        world = [{'npc': self.capture_npc(world_npc, game, models), 'location': registry.locations[name],
+                  'active_times': registry.active_times[name]} for name, world_npc in registry.npcs.items()]
+        scheduler = game.logic.scheduler
+        recorder = game.recorder
+        return {
+            'seed': game.rng.seed,
+            'streams': self.capture_streams(game.rng),
+            'config': {field: getattr(game.config, field) for field in self.CONFIG_FIELDS},
+            'running': game.running,
+            'models': [model for _, model in sorted(models.values(), key=lambda entry: entry[0])],
+            'npc': npc,
+            'world': world,
+            'scheduler': {
+                'events': [(event.turn, event.priority, event.seq, event.kind,
+                            event.target.name if event.target is not None else None, event.payload)
+                           for event in scheduler.heap],
+                'next_seq': scheduler.next_seq,
+                'cancelled': scheduler.cancelled,
+            },
+            'log': {'entries': list(game.log_store.entries), 'spill_buffer': game.log_store.spill_buffer,
+                    'total': game.log_store.total, 'spilled': game.log_store.spilled, 'dropped': game.log_store.dropped},
+            'recorder': {
+                'action_names': recorder.action_names,
+                'player_actions': np.frombuffer(recorder.player_actions, dtype=np.uint16).copy(),
+                'npc_actions': np.frombuffer(recorder.npc_actions, dtype=np.int8).copy(),
+                'response_crcs': np.frombuffer(recorder.response_crcs, dtype=np.uint32).copy(),
+                'npc_names': recorder.npc_names,
+                'local_counts': np.frombuffer(recorder.local_counts, dtype=np.uint16).copy(),
+                'local_npcs': np.frombuffer(recorder.local_npcs, dtype=np.uint16).copy(),
+                'local_actions': np.frombuffer(recorder.local_actions, dtype=np.int8).copy(),
+                'local_crcs': np.frombuffer(recorder.local_crcs, dtype=np.uint32).copy(),
+            },
+        }
+
+    def restore(self, state, headless=False, instrumentation=None):
+        models = [self.restore_model(model) for model in state['models']]
+        indexes = {}
+        rng = SessionRNG(state['seed'])
+        npc = self.restore_npc(state['npc'], rng, models, indexes)
+        game = Game(headless=headless, npc=npc, instrumentation=instrumentation, rng=rng, world_npcs=[])
+        npc.decision_tree.model_search = game.model_search
+        for field, value in state['config'].items():
+            setattr(game.config, field, value)
+        game.running = state['running']
+        for entry in state['world']:
+            world_rng = None
+            if entry['npc']['rng'] is not None:
+                world_rng = SessionRNG(entry['npc']['rng']['seed'])
+            world_npc = self.restore_npc(entry['npc'], world_rng, models, indexes)
+            world_npc.instrumentation = game.instrumentation
+            world_npc.decision_tree.model_search = game.model_search
+            game.registry.add(world_npc, entry['location'], entry['active_times'])
+            if world_rng is not None:
+                self.restore_streams(world_rng, entry['npc']['rng']['streams'])
+        targets = dict(game.registry.npcs)
+        targets[npc.name] = npc
+        scheduler = game.logic.scheduler
+        scheduler.heap = [ScheduledEvent(turn, priority, seq, kind, targets[target] if target is not None else None, payload)
+                          for turn, priority, seq, kind, target, payload in state['scheduler']['events']]
+        scheduler.next_seq = state['scheduler']['next_seq']
+        pending = {event.seq for event in scheduler.heap}
+        scheduler.cancelled = state['scheduler']['cancelled'] & pending
+        scheduler.live = pending - scheduler.cancelled
+        log_store = game.log_store
+        log_store.entries = deque(state['log']['entries'])
+        log_store.spill_buffer = state['log']['spill_buffer']
+        log_store.total = state['log']['total']
+        log_store.spilled = state['log']['spilled']
+        log_store.dropped = state['log']['dropped']
+        recorder = game.recorder
+        recorder.action_names = state['recorder']['action_names']
+        recorder.action_codes = {name: code for code, name in enumerate(recorder.action_names)}
+        recorder.player_actions = array('H', state['recorder']['player_actions'].tobytes())
+        recorder.npc_actions = array('b', state['recorder']['npc_actions'].tobytes())
+        recorder.response_crcs = array('I', state['recorder']['response_crcs'].tobytes())
+        recorder.npc_names = state['recorder']['npc_names']
+        recorder.npc_codes = {name: code for code, name in enumerate(recorder.npc_names)}
+        recorder.local_counts = array('H', state['recorder']['local_counts'].tobytes())
+        recorder.local_npcs = array('H', state['recorder']['local_npcs'].tobytes())
+        recorder.local_actions = array('b', state['recorder']['local_actions'].tobytes())
+        recorder.local_crcs = array('I', state['recorder']['local_crcs'].tobytes())
+        # Streams last: building the game and its NPCs draws from them
+        self.restore_streams(rng, state['streams'])
+        game.visualization.refresh_figures()
+        game.interface.update_status()
+        return game
+
+    @classmethod
+    def save(cls, game, path):
+        snapshot = cls()
+        state = snapshot.pack(snapshot.capture(game))
+        layout = []
+        chunks = []
+        offset = 0
+        crc = 0
+        for value in snapshot.arrays:
+            data = np.ascontiguousarray(value).reshape(-1).view(np.uint8)
+            padding = -offset % cls.ALIGN
+            if padding:
+                chunks.append(bytes(padding))
+                crc = zlib.crc32(chunks[-1], crc)
+                offset += padding
+            layout.append({'dtype': np.lib.format.dtype_to_descr(value.dtype), 'shape': list(value.shape), 'offset': offset})
+            chunks.append(data)
+            crc = zlib.crc32(data, crc)
+            offset += data.nbytes
+        header = json.dumps({'version': 1, 'state': state, 'arrays': layout, 'data_bytes': offset, 'crc32': crc},
+                            separators=(',', ':')).encode('utf-8')
+        prefix = cls.MAGIC + len(header).to_bytes(8, 'little') + header
+        prefix += bytes(-len(prefix) % cls.ALIGN)
+        # Written beside the target and renamed, so a checkpoint is never half-written
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(prefix)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, path)
+        return len(prefix) + offset
+
+    @classmethod
+    def load(cls, path, headless=False, instrumentation=None):
+        with open(path, 'rb') as f:
+            buffer = bytearray(os.fstat(f.fileno()).st_size)
+            f.readinto(buffer)
+        if buffer[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError(f"{path} is not a game snapshot")
+        header_end = len(cls.MAGIC) + 8 + int.from_bytes(buffer[len(cls.MAGIC):len(cls.MAGIC) + 8], 'little')
+        header = json.loads(buffer[len(cls.MAGIC) + 8:header_end].decode('utf-8'))
+        if header.get('version') != 1:
+            raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+        data_start = header_end + (-header_end % cls.ALIGN)
+        data = memoryview(buffer)[data_start:]
+        if len(data) != header['data_bytes'] or zlib.crc32(data) != header['crc32']:
+            raise ValueError(f"{path} is truncated or corrupt")
+        arrays = []
+        for entry in header['arrays']:
+            # Views into the one read buffer, which stays writable
+            dtype = np.lib.format.descr_to_dtype(entry['dtype'])
+            shape = tuple(entry['shape'])
+            count = int(np.prod(shape))
+            arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=entry['offset']).reshape(shape)
+                          if count else np.empty(shape, dtype=dtype))
+        snapshot = cls(arrays)
+        return snapshot.restore(snapshot.unpack(header['state']), headless, instrumentation)
+
+class PoolFullError(Exception):
+    pass
+
+class GameSession:
+    def __init__(self, session_id, game):
+        self.session_id = session_id
+        self.game = game
+        self.lock = threading.Lock()  # a Game is not safe to drive from two requests at once
+        self.created = time.monotonic()
+        self.last_active = self.created
+        self.log_cursor = 0
+
+    def state(self):
+        config = self.game.config
+        return {
+            'session_id': self.session_id,
+            'running': self.game.running,
+            'turn_count': config.turn_count,
+            'player_health': config.player_health,
+            'player_friendly': bool(config.player_friendly),
+            'player_has_item': bool(config.player_has_item),
+            'time_of_day': config.time_of_day,
+            'location': config.location,
+            'npc_name': self.game.npc.name,
+            'npc_health': self.game.npc.health,
+            'npc_mood': self.game.npc.mood,
+            'actions': self.game.interface.actions,
+        }
+
+    def new_messages(self):
+        # Log entries produced since the previous call
+        log_store = self.game.log_store
+        messages = [{'type': message_type, 'text': text} for _, _, message_type, text in log_store.since(self.log_cursor)]
+        self.log_cursor = len(log_store)
+        return messages
+
+class SessionPool:
+    # Hosts many headless games. New sessions share the parsed config files and
+    # the NPC model fitted on the initial training data, so creating one does not
+    # re-read JSON or refit the tree; both are replaced per session on first retrain.
+    def __init__(self, max_sessions=256, idle_timeout=300.0, spare_sessions=4, instrumentation=None,
+                 record_dir=None, mp_context=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.spare_sessions = spare_sessions
+        self.sessions = {}
+        self.spares = deque()
+        self.lock = threading.Lock()
+        self.warm_training_data = None
+        self.warm_clf = None
+        self.model_search = None  # shared by every session's NPCs, closed by stop()
+        self.mp_context = mp_context  # start method for the search's worker processes
+        # One instrumentation surface aggregated over every session in the pool
+        self.instrumentation = instrumentation if instrumentation is not None else TurnInstrumentation()
+        # Recordings of finished sessions are saved here to build a replay corpus
+        self.record_dir = record_dir
+        self.evicted = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        self._reaper = None
+
+    def warm_up(self):
+        settings = load_json_config('npc_config.json').get('model_search')
+        self.model_search = ModelSizeSearch(mp_context=self.mp_context, **settings) if settings else None
+        training_data = NPCTrainingData()
+        self.warm_clf = NPCDecisionTree(training_data, model_search=self.model_search).clf
+        self.warm_training_data = training_data
+        self.refill_spares()
+
+    def build_game(self, seed=None):
+        if self.warm_clf is None:
+            self.warm_up()
+        # Neither NPCTrainingData.append nor retraining mutates shared objects, so
+        # a shallow copy of the warm training data is enough to keep sessions apart
+        training_data = copy.copy(self.warm_training_data)
+        rng = SessionRNG(seed)
+        npc = NPC("Guardian", training_data=training_data, clf=self.warm_clf, rng=rng, model_search=self.model_search)
+        return Game(headless=True, npc=npc, instrumentation=self.instrumentation, rng=rng, model_search=self.model_search)
+
+    def refill_spares(self):
+        while len(self.spares) < self.spare_sessions:
+            game = self.build_game()
+            with self.lock:
+                self.spares.append(game)
+
+    def create_session(self, seed=None):
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                self.rejected += 1
+                raise PoolFullError(f"Session limit of {self.max_sessions} reached")
+            game = self.spares.popleft() if self.spares and seed is None else None
+        if game is None:
+            game = self.build_game(seed)
+        session = GameSession(uuid.uuid4().hex, game)
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                self.rejected += 1
+                raise PoolFullError(f"Session limit of {self.max_sessions} reached")
+            self.sessions[session.session_id] = session
+        return session
+
+    def get_session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is not None:
+            session.last_active = time.monotonic()
+        return session
+
+    def close_session(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.save_recording(session)
+            session.game.close()
+        return session is not None
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self.lock:
+            idle = [session for session in self.sessions.values() if session.last_active < cutoff]
+            for session in idle:
+                del self.sessions[session.session_id]
+            self.evicted += len(idle)
+        for session in idle:
+            self.save_recording(session)
+            session.game.close()
+        return len(idle)
+
+    def save_recording(self, session):
+        if self.record_dir is None or not len(session.game.recorder):
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        with session.lock:
+            session.game.recorder.save(os.path.join(self.record_dir, f"{session.session_id}.json.gz"))
+
+    def start_reaper(self, interval=5.0):
+        def reap():
+            while not self._stop.wait(interval):
+                self.evict_idle()
+                self.refill_spares()
+        self._reaper = threading.Thread(target=reap, daemon=True)
+        self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+            spares = list(self.spares)
+            self.spares.clear()
+        for session in sessions:
+            self.save_recording(session)
+            session.game.close()
+        for game in spares:
+            game.close()
+        if self.model_search is not None:
+            self.model_search.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'spares': len(self.spares),
+                'max_sessions': self.max_sessions,
+                'evicted': self.evicted,
+                'rejected': self.rejected,
+            }
+
+class GameRequestHandler(BaseHTTPRequestHandler):
+    # JSON API:
+    #   POST   /sessions                  create a session, optionally {"seed": <int>}
+    #   GET    /sessions/<id>             session state
+    #   POST   /sessions/<id>/actions     {"action": "<text>"} -> new messages and state
+    #   GET    /sessions/<id>/recording   seed and recorded turns, for SessionReplayer
+    #   GET    /sessions/<id>/memory      MemoryReport for the session, traced under serve --trace-memory
+    #   DELETE /sessions/<id>             end a session
+    #   GET    /stats                     pool statistics
+    #   GET    /metrics                   per-phase turn timings and counters
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately; without this, Nagle's algorithm
+        # holds the body back for a delayed ACK on keep-alive connections
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def dispatch(self, method):
+        # Read the body up front so keep-alive connections stay in sync on errors
+        try:
+            payload = self.read_json() if method == 'POST' else {}
+        except ValueError:
+            self.send_json(400, {'error': "Request body is not valid JSON"})
+            return
+        pool = self.server.pool
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['stats'] and method == 'GET':
+            self.send_json(200, pool.stats())
+            return
+        if parts == ['metrics'] and method == 'GET':
+            self.send_json(200, pool.instrumentation.to_dict())
+            return
+        if parts == ['sessions'] and method == 'POST':
+            seed = payload.get('seed')
+            if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+                self.send_json(400, {'error': "'seed' must be an integer"})
+                return
+            try:
+                session = pool.create_session(seed)
+            except PoolFullError as e:
+                self.send_json(503, {'error': str(e)}, {'Retry-After': '5'})
+                return
+            with session.lock:
+                self.send_json(201, {'state': session.state(), 'messages': session.new_messages()})
+            return
+        if len(parts) < 2 or parts[0] != 'sessions':
+            self.send_json(404, {'error': f"Unknown path: {self.path}"})
+            return
+
+        session = pool.get_session(parts[1])
+        if session is None:
+            self.send_json(404, {'error': f"Unknown session: {parts[1]}"})
+        elif len(parts) == 2 and method == 'GET':
+            with session.lock:
+                self.send_json(200, session.state())
+        elif parts[2:] == ['memory'] and method == 'GET':
+            with session.lock:
+                self.send_json(200, MemoryReport(session.game).collect())
+        elif parts[2:] == ['recording'] and method == 'GET':
+            with session.lock:
+                self.send_json(200, session.game.recorder.to_dict())
+        elif len(parts) == 2 and method == 'DELETE':
+            pool.close_session(session.session_id)
+            self.send_json(200, {'closed': session.session_id})
+        elif parts[2:] == ['actions'] and method == 'POST':
+            action = payload.get('action')
+            if not isinstance(action, str):
+                self.send_json(400, {'error': "Missing 'action'"})
+                return
+            # Only the game's own actions: every distinct string would take a code
+            # in the NPC history and the recorder, whose tables are bounded
+            if action not in session.game.interface.actions:
+                self.send_json(400, {'error': f"Unknown action: {action}", 'actions': session.game.interface.actions})
+                return
+            # Backpressure: bound the number of turns being processed at once
+            if not self.server.inflight.acquire(timeout=self.server.queue_timeout):
+                self.send_json(503, {'error': "Server busy"}, {'Retry-After': '1'})
+                return
+            try:
+                with session.lock:
+                    if not session.game.running:
+                        self.send_json(409, {'error': "Game is over", 'state': session.state()})
+                        return
+                    session.game.logic.player_action(action)
+                    self.send_json(200, {'state': session.state(), 'messages': session.new_messages()})
+            finally:
+                self.server.inflight.release()
+        else:
+            self.send_json(404, {'error': f"Unknown path: {self.path}"})
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+class GameServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=8765, pool=None, max_inflight=32, queue_timeout=2.0):
+        super().__init__((host, port), GameRequestHandler)
+        self.pool = pool if pool is not None else SessionPool()
+        self.inflight = threading.BoundedSemaphore(max_inflight)
+        self.queue_timeout = queue_timeout
+
+    def serve(self):
+        self.pool.warm_up()
+        self.pool.start_reaper()
+        try:
+            self.serve_forever()
+        finally:
+            self.pool.stop()
+            self.server_close()
+
+class LoadGenerator:
+    # Drives a running GameServer with concurrent clients, each playing its own
+    # session over a keep-alive connection, and reports throughput and latency.
+    def __init__(self, host='127.0.0.1', port=8765, clients=8, duration=10.0, turns_per_session=50):
+        self.host = host
+        self.port = port
+        self.clients = clients
+        self.duration = duration
+        self.turns_per_session = turns_per_session
+        self.latencies = []
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def request(self, conn, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = json.loads(response.read() or b'{}')
+        elapsed = time.perf_counter() - start
+        return response.status, data, elapsed
+
+    def client(self, deadline, seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        latencies = []
+        errors = 0
+        session_id = None
+        turns = 0
+        try:
+            while time.perf_counter() < deadline:
+                if session_id is None:
+                    status, data, elapsed = self.request(conn, 'POST', '/sessions', {})
+                    latencies.append(elapsed)
+                    if status != 201:
+                        errors += 1
+                        time.sleep(0.05)
+                        continue
+                    session_id = data['state']['session_id']
+                    actions = data['state']['actions']
+                    turns = 0
+                status, data, elapsed = self.request(conn, 'POST', f'/sessions/{session_id}/actions',
+                                                     {'action': rng.choice(actions)})
+                latencies.append(elapsed)
+                turns += 1
+                if status not in (200, 409):
+                    errors += 1
+                if status != 200 or not data['state']['running'] or turns >= self.turns_per_session:
+                    _, _, elapsed = self.request(conn, 'DELETE', f'/sessions/{session_id}')
+                    latencies.append(elapsed)
+                    session_id = None
+        except (OSError, http.client.HTTPException, ValueError):
+            errors += 1
+        finally:
+            conn.close()
+            if session_id is not None:
+                # The deadline (or an error) left a session open. Delete it on a
+                # fresh connection, outside the measured latencies, so the server
+                # does not hold it until it is evicted as idle
+                cleanup = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                try:
+                    self.request(cleanup, 'DELETE', f'/sessions/{session_id}')
+                except (OSError, http.client.HTTPException, ValueError):
+                    errors += 1
+                finally:
+                    cleanup.close()
+        with self.lock:
+            self.latencies.extend(latencies)
+            self.errors += errors
+
+    def run(self):
+        deadline = time.perf_counter() + self.duration
+        threads = [threading.Thread(target=self.client, args=(deadline, i)) for i in range(self.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        latencies = np.array(self.latencies) * 1000.0
+        report = {
+            'clients': self.clients,
+            'requests': int(latencies.size),
+            'errors': self.errors,
+            'duration_s': round(elapsed, 3),
+            'requests_per_s': round(latencies.size / elapsed, 1) if elapsed else 0.0,
+        }
+        if latencies.size:
+            for p in (50, 90, 95, 99):
+                report[f'p{p}_ms'] = round(float(np.percentile(latencies, p)), 3)
+            report['max_ms'] = round(float(latencies.max()), 3)
+        return report
+
+def measure(fn):
+    # Wall time of an untraced call, then the tracemalloc peak of a second one
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def benchmark_training_data_loading(rows=1_000_000, path='npc_training_data_benchmark.json'):
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(0, 2, rows), rng.integers(0, 2, rows), rng.choice([20, 50, 100], rows),
+        rng.integers(0, 3, rows), rng.integers(0, 4, rows), rng.integers(0, 4, rows),
+    ])
+    with open(path, 'w') as f:
+        json.dump({'features': [[bool(a), bool(b), int(c), int(d), int(e), int(g)] for a, b, c, d, e, g in X.tolist()],
+                   'labels': rng.integers(0, 6, rows).tolist()}, f)
+
+    def json_load():
+        # The loader NPCTrainingData used before TrainingDataLoader
+        with open(path, 'r') as f:
+            training_data = json.load(f)
+        X = np.array(training_data['features'])
+        y = np.array(training_data['labels'])
+        X = np.array([[int(val) if isinstance(val, bool) else val for val in row] for row in X])
+        return X, y
+
+    report = {'rows': rows, 'file_mb': os.path.getsize(path) / 1e6}
+    try:
+        for name, load in (('json_load', json_load), ('chunked', TrainingDataLoader(path).load)):
+            (X, y), elapsed, peak = measure(load)
+            report[name] = {'seconds': elapsed, 'peak_mb': peak / 1e6, 'array_mb': (X.nbytes + y.nbytes) / 1e6}
+    finally:
+        os.remove(path)
+    return report
+
+def benchmark_weighted_training(sizes=(10_000, 100_000, 1_000_000)):
+    # Training on every recorded row versus on distinct rows weighted by count
+    rng = np.random.default_rng(0)
+    report = []
+    for rows in sizes:
+        X = np.column_stack([
+            rng.integers(0, 2, rows), rng.integers(0, 2, rows), rng.choice([20, 50, 100], rows),
+            rng.integers(0, 3, rows), rng.integers(0, 4, rows), rng.integers(0, 4, rows),
+        ])
+        y = rng.integers(0, 6, rows)
+
+        def weigh():
+            # A fresh set per call: measure() runs its callable twice
+            training_data = NPCTrainingData.__new__(NPCTrainingData)
+            training_data.X = np.empty((0, X.shape[1]), dtype=np.int64)
+            training_data.y = np.empty(0, dtype=np.int64)
+            training_data.counts = np.empty(0, dtype=np.int64)
+            training_data.index = {}
+            training_data.append(X, y)
+            return training_data
+
+        training_data, append_seconds, _ = measure(weigh)
+
+        expanded, expanded_seconds, expanded_peak = measure(
+            lambda: DecisionTreeClassifier(random_state=42).fit(X, y))
+        weighted, weighted_seconds, weighted_peak = measure(
+            lambda: DecisionTreeClassifier(random_state=42).fit(
+                training_data.X, training_data.y, sample_weight=training_data.counts))
+        report.append({
+            'rows': rows,
+            'distinct_rows': len(training_data.y),
+            'expanded': {'fit_seconds': expanded_seconds, 'peak_mb': expanded_peak / 1e6, 'data_mb': (X.nbytes + y.nbytes) / 1e6},
+            'weighted': {'fit_seconds': weighted_seconds, 'append_seconds': append_seconds, 'peak_mb': weighted_peak / 1e6,
+                         'data_mb': (training_data.X.nbytes + training_data.y.nbytes + training_data.counts.nbytes) / 1e6},
+            'same_tree': bool(np.array_equal(expanded.tree_.feature, weighted.tree_.feature)
+                              and np.array_equal(expanded.tree_.threshold, weighted.tree_.threshold)
+                              and np.array_equal(expanded.predict(X), weighted.predict(X))),
+        })
+    return report
+
+def benchmark_scheduler(npc_counts=(10, 100, 1_000, 10_000, 50_000), turns=500, evolution_turns=50, respawn_turns=200):
+    # Per-tick cost of checking every NPC's evolution and respawn timers against
+    # popping only the due events from an EventScheduler. Handlers are counters so
+    # the numbers are scheduling overhead alone.
+    rng = random.Random(0)
+    report = []
+    for npcs in npc_counts:
+        offsets = [rng.randrange(evolution_turns) for _ in range(npcs)]
+        respawn_at = [rng.randrange(1, turns * 4) for _ in range(npcs)]
+
+        def poll():
+            fired = 0
+            for turn in range(1, turns + 1):
+                for npc in range(npcs):
+                    if (turn + offsets[npc]) % evolution_turns == 0:
+                        fired += 1
+                    if respawn_at[npc] == turn:
+                        fired += 1
+            return fired
+
+        scheduler = EventScheduler()
+        fired_events = [0]
+
+        def on_evolution(event):
+            fired_events[0] += 1
+            scheduler.schedule(event.turn + evolution_turns, 'npc_evolution', event.target)
+
+        def on_respawn(event):
+            fired_events[0] += 1
+
+        scheduler.register('npc_evolution', on_evolution)
+        scheduler.register('respawn', on_respawn)
+        for npc in range(npcs):
+            scheduler.schedule(evolution_turns - offsets[npc], 'npc_evolution', npc)
+            scheduler.schedule(respawn_at[npc], 'respawn', npc)
+
+        def tick_heap():
+            for turn in range(1, turns + 1):
+                scheduler.run_due(turn)
+            return fired_events[0]
+
+        # timed once each: tick_heap consumes the scheduled events
+        start = time.perf_counter()
+        polled = poll()
+        poll_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        fired = tick_heap()
+        heap_seconds = time.perf_counter() - start
+        report.append({
+            'npcs': npcs,
+            'events_fired': fired,
+            'polling_us_per_tick': poll_seconds / turns * 1e6,
+            'heap_us_per_tick': heap_seconds / turns * 1e6,
+            'same_events': polled == fired,
+        })
+    return report
+
+def benchmark_registry(world_sizes=(100, 1_000, 5_000), local_npcs=20, turns=20):
+    # Per-turn cost of deciding for the NPCs at the player's location through
+    # NPCRegistry, against the same local NPCs one predict at a time and against
+    # every NPC in the world. The local population is fixed while the world grows.
+    report = []
+    for world in world_sizes:
+        game = Game(headless=True, rng=SessionRNG(0))
+        here = game.config.location
+        elsewhere = [location for location in game.config.location_options if location != here]
+        for i in range(world):
+            game.add_npc(f"npc{i}", here if i < local_npcs else elsewhere[i % len(elsewhere)])
+        config = game.config
+        npcs = list(game.registry.npcs.values())
+        local = game.registry.local(here, config.time_of_day)
+
+        def decide_each(npcs):
+            for _ in range(turns):
+                for npc in npcs:
+                    npc.decision_tree.decide_action(config.player_friendly, config.player_has_item, config.time_of_day,
+                                                    config.location, npc.health, npc.mood)
+
+        def tick_local():
+            for _ in range(turns):
+                game.logic.tick_local_npcs("Approach Friendly")
+
+        start = time.perf_counter()
+        tick_local()
+        local_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        decide_each(local)
+        unbatched_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        decide_each(npcs)
+        world_seconds = time.perf_counter() - start
+        report.append({
+            'world_npcs': world,
+            'local_npcs': len(local),
+            'registry_ms_per_turn': local_seconds / turns * 1e3,
+            'local_unbatched_ms_per_turn': unbatched_seconds / turns * 1e3,
+            'all_npcs_ms_per_turn': world_seconds / turns * 1e3,
+        })
+    return report
+
+def benchmark_tree_bank(npc_counts=(10, 100, 1_000, 5_000), rows=200, repeats=20):
+    # Deciding once for each of many NPCs with distinct trees: one sklearn
+    # predict per NPC against one TreeBank traversal. Also times replacing a
+    # single NPC's tree against rebuilding the whole bank.
+    rng = np.random.default_rng(0)
+    report = []
+    for npcs in npc_counts:
+        models = []
+        for _ in range(npcs):
+            X = np.column_stack([
+                rng.integers(0, 2, rows), rng.integers(0, 2, rows), rng.choice([20, 50, 100], rows),
+                rng.integers(0, 3, rows), rng.integers(0, 4, rows), rng.integers(0, 4, rows),
+            ])
+            models.append(DecisionTreeClassifier(random_state=42).fit(X, rng.integers(0, 6, rows)))
+        contexts = X[rng.integers(0, rows, npcs)]
+        bank = TreeBank()
+        for key, clf in enumerate(models):
+            bank.set(key, clf)
+        keys = list(range(npcs))
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            per_npc = [clf.predict(contexts[i:i + 1])[0] for i, clf in enumerate(models)]
+        per_npc_seconds = (time.perf_counter() - start) / repeats
+        start = time.perf_counter()
+        for _ in range(repeats):
+            banked = bank.predict(keys, contexts)
+        bank_seconds = (time.perf_counter() - start) / repeats
+
+        replacement = DecisionTreeClassifier(random_state=0).fit(X, rng.integers(0, 6, rows))
+        start = time.perf_counter()
+        bank.set(0, replacement)
+        update_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        rebuilt = TreeBank()
+        for key, clf in enumerate([replacement] + models[1:]):
+            rebuilt.set(key, clf)
+        rebuild_seconds = time.perf_counter() - start
+        report.append({
+            'npcs': npcs,
+            'nodes': bank.used,
+            'per_npc_predict_ms': per_npc_seconds * 1e3,
+            'tree_bank_ms': bank_seconds * 1e3,
+            'update_one_ms': update_seconds * 1e3,
+            'rebuild_ms': rebuild_seconds * 1e3,
+            'same_actions': bool(np.array_equal(per_npc, banked))
+                            and bool(np.array_equal(bank.predict(keys, contexts), rebuilt.predict(keys, contexts))),
+        })
+    return report
+
+def benchmark_snapshot(checkpoints=(100, 1_000, 5_000, 20_000), world_npcs=10, path='game_snapshot_benchmark.snap'):
+    # Snapshot size and save/load time as a session's history grows, and whether
+    # the loaded game captures to the same state as the saved one
+    game = Game(headless=True, rng=SessionRNG(0))
+    for i in range(world_npcs):
+        game.add_npc(f"npc{i}", game.config.location_options[i % len(game.config.location_options)])
+    actions = random.Random(0)
+    report = []
+    try:
+        for turns in checkpoints:
+            while game.config.turn_count < turns:
+                game.config.player_health = max(game.config.player_health, 50)  # keep the session running
+                game.npc.health = max(game.npc.health, 50)
+                game.logic.player_action(actions.choice(game.interface.actions))
+            start = time.perf_counter()
+            size = GameSnapshot.save(game, path)
+            save_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = GameSnapshot.load(path, headless=True)
+            load_seconds = time.perf_counter() - start
+            saved, restored = GameSnapshot(), GameSnapshot()
+            saved_state = saved.pack(saved.capture(game))
+            restored_state = restored.pack(restored.capture(loaded))
+            report.append({
+                'turns': turns,
+                'snapshot_kb': size / 1e3,
+                'training_rows': len(game.npc.training_data.y),
+                'save_ms': save_seconds * 1e3,
+                'load_ms': load_seconds * 1e3,
+                'round_trip_exact': saved_state == restored_state and len(saved.arrays) == len(restored.arrays)
+                                    and all(np.array_equal(a, b) for a, b in zip(saved.arrays, restored.arrays)),
+            })
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return report
+
+def _model_distribution_worker(connection, publisher_name, contexts):
+    # Benchmark worker: each message is a pickled model, or empty to use the
+    # newest published one; replies with its decisions for contexts
+    reader = SharedModelReader(publisher_name)
+    try:
+        while True:
+            message = connection.recv_bytes()
+            if message == b'stop':
+                break
+            if message:
+                connection.send(pickle.loads(message).predict(contexts))
+            else:
+                connection.send(reader.predict(contexts))
+    finally:
+        reader.close()
+
+def benchmark_model_distribution(worker_counts=(1, 2, 4, 8), models=5, rows=200_000):
+    # Time from a retrained model being ready to every worker having decided
+    # with it: pickling the estimator to each worker against publishing its
+    # node arrays once to shared memory and letting workers map them
+    rng = np.random.default_rng(0)
+    X = np.column_stack([
+        rng.integers(0, 2, rows), rng.integers(0, 2, rows), rng.integers(0, 101, rows),
+        rng.integers(0, 3, rows), rng.integers(0, 4, rows), rng.integers(0, 4, rows),
+    ])
+    y = rng.integers(0, 6, rows)
+    fitted = []
+    for _ in range(models):
+        sample = rng.integers(0, rows, rows)
+        fitted.append(DecisionTreeClassifier(random_state=42).fit(X[sample], y[sample]))
+    contexts = X[:256]
+    expected = [clf.predict(contexts) for clf in fitted]
+    report = []
+    for workers in worker_counts:
+        publisher = SharedModelPublisher()
+        pipes = [Pipe() for _ in range(workers)]
+        processes = [Process(target=_model_distribution_worker, args=(child, publisher.name, contexts), daemon=True)
+                     for _, child in pipes]
+        for process in processes:
+            process.start()
+        connections = [parent for parent, _ in pipes]
+        timings = {'pickle': [], 'shared_memory': []}
+        correct = True
+        try:
+            for mode in timings:
+                for clf, actions in zip(fitted, expected):
+                    start = time.perf_counter()
+                    if mode == 'pickle':
+                        payload = pickle.dumps(clf, protocol=pickle.HIGHEST_PROTOCOL)
+                    else:
+                        publisher.publish(clf)
+                        payload = b''
+                    for connection in connections:
+                        connection.send_bytes(payload)
+                    replies = [connection.recv() for connection in connections]
+                    timings[mode].append(time.perf_counter() - start)
+                    correct = correct and all(np.array_equal(reply, actions) for reply in replies)
+        finally:
+            for connection in connections:
+                connection.send_bytes(b'stop')
+            for process in processes:
+                process.join()
+            publisher.close()
+        report.append({
+            'workers': workers,
+            'model_nodes': int(np.mean([clf.tree_.node_count for clf in fitted])),
+            'pickle_bytes_per_worker': len(pickle.dumps(fitted[-1], protocol=pickle.HIGHEST_PROTOCOL)),
+            'pickle_ms': float(np.median(timings['pickle'])) * 1e3,
+            'shared_memory_ms': float(np.median(timings['shared_memory'])) * 1e3,
+            'same_actions': correct,
+        })
+    return report
+
+BENCHMARKS = {
+    'loading': benchmark_training_data_loading,
+    'weighted_training': benchmark_weighted_training,
+    'scheduler': benchmark_scheduler,
+    'registry': benchmark_registry,
+    'tree_bank': benchmark_tree_bank,
+    'snapshot': benchmark_snapshot,
+    'model_distribution': benchmark_model_distribution,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Decisions n Dialogue")
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help="Run the local multi-session game server")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--max-sessions', type=int, default=256)
+    serve_parser.add_argument('--idle-timeout', type=float, default=300.0)
+    serve_parser.add_argument('--max-inflight', type=int, default=32)
+    serve_parser.add_argument('--instrument', action='store_true', help="Record per-phase turn timings")
+    serve_parser.add_argument('--trace-memory', action='store_true', help="Trace allocations for the memory reports")
+    serve_parser.add_argument('--record-dir', help="Save finished sessions' recordings to this directory")
+    load_parser = subparsers.add_parser('loadgen', help="Generate load against a running game server")
+    load_parser.add_argument('--host', default='127.0.0.1')
+    load_parser.add_argument('--port', type=int, default=8765)
+    load_parser.add_argument('--clients', type=int, default=8)
+    load_parser.add_argument('--duration', type=float, default=10.0)
+    replay_parser = subparsers.add_parser('replay', help="Replay recorded sessions and verify NPC behaviour")
+    replay_parser.add_argument('recordings', nargs='+')
+    benchmark_parser = subparsers.add_parser('benchmark', help="Run a performance benchmark")
+    benchmark_parser.add_argument('name', choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if args.trace_memory:
+            MemoryReport.start()
+        pool = SessionPool(max_sessions=args.max_sessions, idle_timeout=args.idle_timeout,
+                           instrumentation=TurnInstrumentation(enabled=args.instrument),
+                           record_dir=args.record_dir,
+                           # Fresh workers rather than forks of a process running request threads
+                           mp_context='forkserver' if 'forkserver' in get_all_start_methods() else None)
+        server = GameServer(args.host, args.port, pool=pool, max_inflight=args.max_inflight)
+        print(f"Serving Decisions n Dialogue on http://{args.host}:{args.port}")
+        server.serve()
+    elif args.command == 'loadgen':
+        report = LoadGenerator(args.host, args.port, clients=args.clients, duration=args.duration).run()
+        print(json.dumps(report, indent=2))
+    elif args.command == 'replay':
+        failed = 0
+        for path in args.recordings:
+            report = SessionReplayer(SessionRecorder.load(path)).run()
+            failed += not report['identical']
+            status = 'OK' if report['identical'] else f"MISMATCH at turn {report['mismatches'][0]['turn']}"
+            print(f"{path}: {status} ({report['turns']} turns, {report['turns_per_s']:.0f} turns/s)")
+        sys.exit(1 if failed else 0)
+    elif args.command == 'benchmark':
+        print(json.dumps(BENCHMARKS[args.name](), indent=2))
+    else:
+        game = Game()
+        game.run()
+
 if __name__ == "__main__":
-    game = Game()
-    game.run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import importlib.util
+import os
+import random
+import time
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+spec = importlib.util.spec_from_file_location(
+    'decision_dialogue_dev', os.path.join(os.path.dirname(__file__), '0_M3_DecisionDialogue_Dev.py'))
+dev = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(dev)
+
+# Short values keep the coerced training array at '<U5', the width of 'False'
+TIMES = ['day', 'night']
+LOCATIONS = ['cave', 'hill']
+
+
+@pytest.fixture
+def training_set():
+    rng = random.Random(0)
+    X = [(rng.choice([True, False]), rng.choice([True, False]), rng.choice([True, False]),
+          rng.choice(TIMES), rng.choice(LOCATIONS)) for _ in range(300)]
+    # Learnable labels that differ from default_decision for friendly NPCs without an item
+    y = ['talk' if time_of_day == 'day' else 'trade' for _, _, _, time_of_day, _ in X]
+    return X, y
+
+
+@pytest.fixture
+def tree(training_set):
+    tree = dev.DecisionTree()
+    tree.train(*training_set)
+    return tree
+
+
+def reference_codes(X, context):
+    # One LabelEncoder per column of the coerced training array, as sklearn would do it
+    columns = np.asarray(X).T
+    row = np.asarray([context] + list(X))[0]
+    return tuple(int(LabelEncoder().fit(column).transform([value])[0]) for column, value in zip(columns, row))
+
+
+def test_encode_context_matches_per_column_label_encoders(training_set, tree):
+    X, _ = training_set
+    for context in set(X):
+        assert tree.encoder.encode_context(context) == reference_codes(X, context)
+
+
+def test_decisions_match_tree_on_reference_encoding(training_set, tree):
+    X, _ = training_set
+    for context in set(X):
+        expected = tree.encoder.decode_label(tree.clf.predict([reference_codes(X, context)])[0])
+        assert tree.make_decision(*context) == expected
+
+
+def test_equal_but_differently_encoded_contexts_do_not_share_cache_entries(training_set):
+    X, y = training_set
+    fresh = dev.DecisionTree()
+    fresh.train(X, y)
+    expected = fresh.make_decision(True, False, True, 'day', 'cave')
+    assert expected == 'talk'
+
+    tree = dev.DecisionTree()
+    tree.train(X, y)
+    # 1 and 0 were never seen in training ('True'/'False' were), so this takes the fallback
+    assert tree.make_decision(1, 0, 1, 'day', 'cave') == tree.default_decision(1, 0, 1) == 'give_item'
+    assert tree.make_decision(True, False, True, 'day', 'cave') == expected
+
+
+def test_unseen_value_is_not_truncated_to_a_known_one(training_set, tree):
+    assert tree.encoder.encode_context((True, False, True, 'nightfall', 'cave')) is None
+    assert tree.make_decision(True, False, True, 'nightfall', 'cave') == tree.default_decision(True, False, True)
+
+
+def test_decision_latency(training_set, tree):
+    X, _ = training_set
+    contexts = sorted(set(X))
+    start = time.perf_counter()
+    for context in contexts:
+        tree.make_decision(*context)
+    first_decision = (time.perf_counter() - start) / len(contexts)
+    start = time.perf_counter()
+    for _ in range(100):
+        for context in contexts:
+            tree.make_decision(*context)
+    cached_decision = (time.perf_counter() - start) / (100 * len(contexts))
+    assert first_decision < 5e-3
+    assert cached_decision < 50e-6
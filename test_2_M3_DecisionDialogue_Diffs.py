@@ -0,0 +1,356 @@
+import http.client
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+from sklearn.model_selection import KFold, cross_val_score
+from sklearn.tree import DecisionTreeClassifier
+
+spec = importlib.util.spec_from_file_location(
+    'decision_dialogue_diffs', os.path.join(os.path.dirname(__file__), '2_M3_DecisionDialogue_Diffs.py'))
+diffs = importlib.util.module_from_spec(spec)
+# Registered like a notebook's __main__, so functions pickle by reference but workers cannot import them
+sys.modules[spec.name] = diffs
+spec.loader.exec_module(diffs)
+
+ACTIONS = ['Approach Friendly', 'Approach Cautiously', 'Attack', 'Trade', 'Leave', 'Talk']
+
+
+def training_rows(n, seed=0):
+    rng = random.Random(seed)
+    features = [[rng.choice([True, False]), rng.choice([True, False]), rng.choice([20, 50, 100]),
+                 rng.randrange(3), rng.randrange(4), rng.randrange(4)] for _ in range(n)]
+    labels = [rng.randrange(6) for _ in range(n)]
+    return features, labels
+
+
+def write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def game_dir(tmp_path, monkeypatch):
+    # The config files a game reads from the working directory, with a small training set
+    features, labels = training_rows(120)
+    write_json(tmp_path / 'npc_training_data.json', {'features': features, 'labels': labels})
+    write_json(tmp_path / 'npc_config.json', {
+        'initial_health': 100, 'friendly_options': [True, False], 'has_item_options': [True, False],
+        'mood_options': ['happy', 'neutral', 'angry']})
+    write_json(tmp_path / 'game_config.json', {
+        'initial_player_health': 100, 'initial_player_friendly': True, 'initial_player_has_item': False,
+        'time_options': ['morning', 'afternoon', 'evening', 'night'],
+        'location_options': ['forest', 'village', 'castle', 'dungeon'],
+        'color_scheme': {'background': '#000', 'text': '#fff'},
+        'attack_keywords': ['attack', 'strike'], 'give_keywords': ['give', 'offer'],
+        'npc_attack_damage': 10, 'npc_evolution_turns': 5, 'environment_change_turns': 7,
+        'action_options': [{'text': action, 'intent': action.lower()} for action in ACTIONS]})
+    write_json(tmp_path / 'player_actions.json', {
+        action: {'message': f'You {action}', 'effects': [{'attribute': 'player_friendly', 'value': action != 'Attack'}]}
+        for action in ACTIONS})
+    write_json(tmp_path / 'npc_responses.json', {
+        kind: [f'{{npc_name}} does {kind} to {{player_action}}']
+        for kind in ['attack', 'greet', 'talk', 'retreat', 'offer_item', 'propose_trade', 'ignore']})
+    monkeypatch.chdir(tmp_path)
+    diffs._config_cache.clear()
+    return tmp_path
+
+
+def test_retrain_with_model_search_uses_default_start_method(game_dir):
+    # Workers cannot import this module by name, so only a forked worker can
+    # find _evaluate_tree_candidates
+    search = diffs.ModelSizeSearch(max_depths=(None, 3), min_samples_leafs=(1, 5), ccp_alphas=(0.0,), workers=2)
+    try:
+        npc = diffs.NPC('Guardian', rng=diffs.SessionRNG(1), model_search=search)
+        for action in ACTIONS * 2:
+            npc.interact(action, True, False, 'morning', 'village')
+        npc.decision_tree.update_decision_tree()
+        assert len(npc.decision_tree.model_selection_history) == 2
+        assert npc.decision_tree.model_version == 1
+    finally:
+        search.close()
+
+
+@pytest.fixture
+def server(game_dir):
+    server = diffs.GameServer(port=0, pool=diffs.SessionPool(spare_sessions=0))
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+
+
+def request(server, method, path, payload=None):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    try:
+        conn.request(method, path, body=json.dumps(payload) if payload is not None else None,
+                     headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def test_server_rejects_unknown_actions_before_playing_a_turn(server):
+    status, data = request(server, 'POST', '/sessions', {'seed': 3})
+    assert status == 201
+    session_id = data['state']['session_id']
+    status, data = request(server, 'POST', f'/sessions/{session_id}/actions', {'action': 'Dance'})
+    assert status == 400
+    assert data['actions'] == ACTIONS
+    game = server.pool.get_session(session_id).game
+    assert game.config.turn_count == 0
+    assert game.npc.decision_tree.interaction_history.action_names == []
+    status, data = request(server, 'POST', f'/sessions/{session_id}/actions', {'action': 'Talk'})
+    assert status == 200
+    assert data['state']['turn_count'] == 1
+
+
+def test_server_rejects_boolean_seed(server):
+    status, _ = request(server, 'POST', '/sessions', {'seed': True})
+    assert status == 400
+    assert server.pool.stats()['sessions'] == 0
+
+
+def weighted_set(seed):
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 4, (60, 4))
+    y = rng.integers(0, 3, 60)
+    counts = rng.integers(1, 6, 60)
+    return X, y, counts, np.repeat(X, counts, axis=0), np.repeat(y, counts)
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('leaf', [1, 2, 5, 200])
+def test_model_search_tree_matches_tree_on_expanded_rows(seed, leaf):
+    X, y, counts, expanded_X, expanded_y = weighted_set(seed)
+    weighted = diffs._weighted_tree({'min_samples_leaf': leaf}, X, counts).fit(X, y, sample_weight=counts)
+    expanded = DecisionTreeClassifier(random_state=42, min_samples_leaf=leaf).fit(expanded_X, expanded_y)
+    assert weighted.tree_.node_count == expanded.tree_.node_count
+    assert np.array_equal(weighted.tree_.feature, expanded.tree_.feature)
+    assert np.array_equal(weighted.tree_.threshold, expanded.tree_.threshold)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_model_search_cross_validation_matches_expanded_rows(seed):
+    X, y, counts, expanded_X, expanded_y = weighted_set(seed)
+    params = {'max_depth': 4, 'min_samples_leaf': 5, 'ccp_alpha': 0.0}
+    result, = diffs._evaluate_tree_candidates(X, y, counts, 5, [(0, params)])
+    expected = cross_val_score(DecisionTreeClassifier(random_state=42, **params), expanded_X, expanded_y,
+                               cv=KFold(5, shuffle=True, random_state=42)).mean()
+    assert result['cv_accuracy'] == pytest.approx(expected, abs=1e-12)
+
+
+def test_training_data_ignores_empty_batches(game_dir):
+    training_data = diffs.NPCTrainingData()
+    rows = len(training_data)
+    training_data.append(np.empty((0, 6), dtype=np.int64), [])
+    assert len(training_data) == rows
+    write_json(game_dir / 'empty.json', {'features': [], 'labels': []})
+    assert len(diffs.NPCTrainingData('empty.json')) == 0
+
+
+def play_concurrently(instrumentation, sessions=4, turns=10):
+    games = [diffs.Game(headless=True, instrumentation=instrumentation, rng=diffs.SessionRNG(seed))
+             for seed in range(sessions)]
+    errors = []
+
+    def play(game):
+        try:
+            for turn in range(turns):
+                game.logic.player_action(ACTIONS[turn % len(ACTIONS)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=play, args=(game,)) for game in games]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for game in games:
+        game.close()
+    return errors
+
+
+@pytest.mark.parametrize('mode', ['cprofile', 'sampling'])
+def test_profile_window_shared_by_concurrent_sessions(game_dir, monkeypatch, mode):
+    update_game_state = diffs.GameLogic.update_game_state
+
+    def slow_update_game_state(logic):
+        # Gives up the GIL within each turn, so the sampler gets to run
+        time.sleep(0.002)
+        update_game_state(logic)
+
+    monkeypatch.setattr(diffs.GameLogic, 'update_game_state', slow_update_game_state)
+    instrumentation = diffs.TurnInstrumentation()
+    instrumentation.profile_turns(8, mode=mode, interval=0.0005)
+    assert play_concurrently(instrumentation) == []
+    report = instrumentation.profile_report
+    assert report['mode'] == mode
+    if mode == 'cprofile':
+        # Exactly the window's turns, each profiled on the thread that played it
+        calls = {row['function'].split(' ')[0]: row['calls'] for row in report['functions']}
+        assert calls['interact'] == 8
+    else:
+        # Every sample is of a thread in the middle of its profiled turn
+        assert report['samples'] > 0
+        assert max(row['samples'] for row in report['cumulative'] if row['function'].startswith('interact ')) == report['samples']
+    # Instrumentation goes back to disabled once the window is over
+    assert instrumentation.enabled is False
+    turns = instrumentation.turns
+    assert play_concurrently(instrumentation, sessions=1) == []
+    assert instrumentation.turns == turns
+
+
+def test_figure_cache_builds_before_game_has_its_visualization(game_dir):
+    # The notebook interface needs its image files, so a headless game stands in
+    # for the parts the visualization reads
+    game = diffs.Game(headless=True)
+    game.headless = False
+    # The first build is submitted from GameVisualization.__init__, before Game
+    # assigns self.visualization
+    del game.visualization
+    visualization = diffs.GameVisualization(game)
+    try:
+        assert set(visualization.figure_cache.future.result()) == {'tree', 'metrics', 'importance', 'evolution'}
+    finally:
+        game.visualization = visualization
+        game.close()
+    with pytest.raises(RuntimeError):
+        visualization.figure_cache.executor.submit(print)
+
+
+def test_replay_checks_world_npc_decisions(game_dir):
+    config_path = game_dir / 'game_config.json'
+    config = json.loads(config_path.read_text())
+    config['world_npcs'] = [{'name': f'Villager {i}', 'location': location}
+                            for i, location in enumerate(['forest', 'village', 'castle', 'dungeon'])]
+    write_json(config_path, config)
+    diffs._config_cache.clear()
+    game = diffs.Game(headless=True, rng=diffs.SessionRNG(7))
+    rng = random.Random(7)
+    for _ in range(20):
+        if game.running:
+            game.logic.player_action(rng.choice(ACTIONS))
+    game.close()
+    recording = diffs.SessionRecorder.from_dict(json.loads(json.dumps(game.recorder.to_dict())))
+    assert sum(recording.local_counts) > 0
+    assert diffs.SessionReplayer(recording).run()['identical']
+
+    # A world NPC that acts differently is caught even though the Guardian matches
+    turn = next(turn for turn, count in enumerate(recording.local_counts) if count)
+    first = sum(recording.local_counts[:turn])
+    recording.local_actions[first] = (recording.local_actions[first] + 1) % 6
+    report = diffs.SessionReplayer(recording).run()
+    assert not report['identical']
+    mismatch, = report['mismatches']
+    assert mismatch['turn'] == turn
+    assert mismatch['npc_action'] == mismatch['expected_npc_action'] and mismatch['response_matches']
+    assert not mismatch['local_npcs_match']
+
+
+def load_training_text(tmp_path, text, read_size=1 << 20):
+    path = tmp_path / 'training.json'
+    path.write_text(text)
+    return diffs.TrainingDataLoader(str(path), read_size=read_size).load()
+
+
+@pytest.mark.parametrize('read_size', [1, 3, 64, 1 << 20])
+def test_loader_reads_only_top_level_keys(tmp_path, read_size):
+    X, y = load_training_text(
+        tmp_path, '{"meta": {"labels": [7, 8], "note": "\\"features\\": [[9]] ]"}, '
+                  '"features": [[1, true], [3, false]], "labels": [1, 2], "extra": [{"labels": [5]}]}', read_size)
+    assert X.tolist() == [[1, 1], [3, 0]]
+    assert y.tolist() == [1, 2]
+
+
+@pytest.mark.parametrize('text, message', [
+    ('{"features": [[1, 2]], "labels": [1], "labels": [2]}', 'more than once'),
+    ('{"features": [[1, 2]], "labels": 3}', 'must be an array'),
+    ('{"meta": {"features": [[1, 2]], "labels": [1]}}', "expected 'features' and 'labels'"),
+    # Ragged rows, including ones whose lengths add up to rows * width
+    ('{"features": [[1, 2], [3]], "labels": [1, 2]}', 'must all have 2 values'),
+    ('{"features": [[1, 2], [3], [4, 5, 6]], "labels": [1, 2, 3]}', 'must all have 2 values'),
+    ('{"features": [[1, 2], [3, 4, 5], [6]], "labels": [1, 2, 3]}', 'must all have 2 values'),
+])
+@pytest.mark.parametrize('read_size', [2, 1 << 20])
+def test_loader_rejects_malformed_training_data(tmp_path, text, message, read_size):
+    with pytest.raises(ValueError, match=message):
+        load_training_text(tmp_path, text, read_size)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = diffs.EventScheduler()
+    scheduler.fired = []
+    scheduler.register('respawn', lambda event: scheduler.fired.append(event.seq))
+    return scheduler
+
+
+def test_scheduler_ignores_cancel_of_fired_event(scheduler):
+    seq = scheduler.schedule(1, 'respawn')
+    assert scheduler.run_due(1) == 1
+    scheduler.cancel(seq)
+    scheduler.schedule(2, 'respawn')
+    assert len(scheduler) == 1
+    assert scheduler.cancelled == set()
+    assert scheduler.run_due(2) == 1
+
+
+def test_scheduler_counts_double_and_unknown_cancels_once(scheduler):
+    kept = scheduler.schedule(3, 'respawn')
+    dropped = scheduler.schedule(3, 'respawn')
+    scheduler.cancel(dropped)
+    scheduler.cancel(dropped)
+    scheduler.cancel(12345)
+    assert len(scheduler) == 1
+    assert scheduler.cancelled == {dropped}
+    assert scheduler.run_due(3) == 1
+    assert scheduler.fired == [kept]
+    assert len(scheduler) == 0
+    assert scheduler.cancelled == set()
+
+
+def test_snapshot_restores_live_and_cancelled_events(game_dir):
+    game = diffs.Game(headless=True, rng=diffs.SessionRNG(2))
+    scheduler = game.logic.scheduler
+    pending = scheduler.schedule(50, 'respawn', game.npc)
+    cancelled = scheduler.schedule(60, 'respawn', game.npc)
+    scheduler.cancel(cancelled)
+    fired = scheduler.schedule(0, 'cooldown', game.npc, 'Attack')
+    scheduler.run_due(0)
+    scheduler.cancel(fired)
+    restored = diffs.GameSnapshot().restore(diffs.GameSnapshot().capture(game), headless=True)
+    restored_scheduler = restored.logic.scheduler
+    assert restored_scheduler.live == scheduler.live
+    assert pending in restored_scheduler.live
+    assert restored_scheduler.cancelled == {cancelled}
+    assert len(restored_scheduler) == len(scheduler)
+    restored_scheduler.cancel(cancelled)
+    assert len(restored_scheduler) == len(scheduler)
+
+    # A snapshot saved with stale cancels (seqs no longer in the heap) is cleaned up
+    state = diffs.GameSnapshot().capture(game)
+    state['scheduler']['cancelled'] = {cancelled, fired, 999}
+    restored_scheduler = diffs.GameSnapshot().restore(state, headless=True).logic.scheduler
+    assert restored_scheduler.cancelled == {cancelled}
+    assert len(restored_scheduler) == len(scheduler)
+    game.close()
+    restored.close()
+
+
+def test_memory_report_request_does_not_start_tracing(server):
+    assert not tracemalloc.is_tracing()
+    _, data = request(server, 'POST', '/sessions', {})
+    status, report = request(server, 'GET', f"/sessions/{data['state']['session_id']}/memory?trace=1")
+    assert status == 200
+    assert report['tracing'] is False
+    assert not tracemalloc.is_tracing()